@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+import os
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from chip8.analyzer import analyze
+from argparse import ArgumentParser
+import json
+
+
+def ranges(addresses):
+    """
+    Merge sorted instruction addresses into (first, last) runs
+    """
+    runs = []
+    for address in addresses:
+        if runs and address == runs[-1][1] + 2:
+            runs[-1][1] = address
+        else:
+            runs.append([address, address])
+    return runs
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Static analysis of a ROM: code, data and self-modifying writes")
+    parser.add_argument("rom", help="ROM to analyze")
+    parser.add_argument("--json", action="store_true", help="Print the full analysis as JSON")
+    args = parser.parse_args()
+
+    with open(args.rom, "rb") as rom_file:
+        analysis = analyze(rom_file.read())
+
+    if args.json:
+        print(json.dumps(analysis, indent=2))
+    else:
+        print(f"sha256          {analysis['sha256']}")
+        print(f"instructions    {len(analysis['code'])} reachable, {len(analysis['opcodes'])} distinct opcodes, {len(analysis['leaders'])} basic blocks")
+        print("code            " + (", ".join(f"{first:#05x}-{last + 1:#05x}" for first, last in ranges(analysis["code"])) or "none"))
+        print("data            " + (", ".join(f"{start:#05x}-{end - 1:#05x}" for start, end in analysis["data"]) or "none"))
+        for pc, address in analysis["self_modifying"]:
+            print(f"self-modifying  {pc:#05x} writes code at {address:#05x}")
+        for pc in analysis["unknown_writes"]:
+            print(f"unknown write   {pc:#05x} stores to an address not known statically")
+        for pc in analysis["indirect_jumps"]:
+            print(f"indirect jump   {pc:#05x} (Bnnn), code behind it may be missing")
+        for pc in analysis["invalid"]:
+            print(f"invalid opcode  {pc:#05x}")
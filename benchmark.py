@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+import os
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from chip8.cpu import Chip8CPU
+from chip8.framebuffer import Chip8Framebuffer
+from chip8.translator import Chip8TranslatingCPU
+from timeit import default_timer as timer
+from argparse import ArgumentParser
+import subprocess
+import statistics
+import platform
+import json
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+ENGINES = {"interpreter": Chip8CPU, "block": Chip8TranslatingCPU}
+
+# synthetic workloads, each one an endless loop stressing one kind of instruction
+WORKLOADS = {
+    # ALU-heavy: arithmetic, logic and shifts on registers
+    "alu": bytes.fromhex(
+        "6001"  # 200: V0 = 1
+        "6103"  # 202: V1 = 3
+        "6207"  # 204: V2 = 7
+        "8014"  # 206: V0 += V1
+        "8125"  # 208: V1 -= V2
+        "8206"  # 20A: V2 = V0 >> 1
+        "830E"  # 20C: V3 = V0 << 1
+        "8312"  # 20E: V3 &= V1
+        "8433"  # 210: V4 ^= V3
+        "7405"  # 212: V4 += 5
+        "8541"  # 214: V5 |= V4
+        "8657"  # 216: V6 = V5 - V6
+        "F51E"  # 218: I += V5
+        "A300"  # 21A: I = 0x300
+        "1206"  # 21C: jump 206
+    ),
+    # branch-heavy: skips, jumps, calls and returns
+    "branch": bytes.fromhex(
+        "6000"  # 200: V0 = 0
+        "6100"  # 202: V1 = 0
+        "7001"  # 204: V0 += 1
+        "3000"  # 206: skip if V0 == 0
+        "120C"  # 208: jump 20C
+        "7101"  # 20A: V1 += 1
+        "5010"  # 20C: skip if V0 == V1
+        "2216"  # 20E: call 216
+        "9010"  # 210: skip if V0 != V1
+        "6100"  # 212: V1 = 0
+        "1204"  # 214: jump 204
+        "4080"  # 216: skip if V0 != 0x80
+        "6100"  # 218: V1 = 0
+        "00EE"  # 21A: return
+    ),
+    # draw-heavy: font sprites all over the screen, clipped at the edges
+    "draw": bytes.fromhex(
+        "A000"  # 200: I = 0 (font)
+        "D015"  # 202: draw 5 rows at (V0, V1)
+        "7003"  # 204: V0 += 3
+        "7105"  # 206: V1 += 5
+        "D12A"  # 208: draw 10 rows at (V1, V2)
+        "7207"  # 20A: V2 += 7
+        "4000"  # 20C: skip if V0 != 0
+        "00E0"  # 20E: clear screen
+        "1202"  # 210: jump 202
+    ),
+    # timer polling: delay timer loaded and read back in a loop
+    "timer": bytes.fromhex(
+        "6005"  # 200: V0 = 5
+        "F015"  # 202: delay timer = V0
+        "F107"  # 204: V1 = delay timer
+        "3100"  # 206: skip if V1 == 0
+        "1204"  # 208: jump 204
+        "1200"  # 20A: jump 200
+    ),
+}
+
+
+# cold start: import the engine, build a machine, load a ROM and run one frame in a fresh interpreter
+STARTUP_SCRIPT = """
+import sys
+from chip8.framebuffer import Chip8Framebuffer
+from {module} import {name}
+cpu = {name}(Chip8Framebuffer(), seed=0)
+cpu.load_memory(bytearray.fromhex(sys.argv[1]), 0x200)
+cpu.run_frame()
+"""
+
+
+def load_workloads(names=None) -> dict:
+    """
+    Synthetic workloads plus every ROM in roms/
+    """
+    workloads = dict(WORKLOADS)
+    rom_dir = os.path.join(ROOT, "roms")
+    if os.path.isdir(rom_dir):
+        for name in sorted(os.listdir(rom_dir)):
+            with open(os.path.join(rom_dir, name), "rb") as rom_file:
+                workloads[os.path.splitext(name)[0]] = rom_file.read()
+    if names:
+        workloads = {name: rom for name, rom in workloads.items() if name in names}
+    return workloads
+
+
+def measure(engine, rom: bytes, cycles: int, warmup: int) -> tuple:
+    """
+    Run a ROM headless on a fresh machine and return instructions actually run per second,
+    and the share of the virtual clock's instructions skipped by idle loop detection (those are not counted as run).
+    The warmup instructions (decoding, translating) are not timed.
+    """
+    cpu = engine(Chip8Framebuffer(), seed=0)
+    with open(os.path.join(ROOT, "font.ch8"), "rb") as font_file:
+        cpu.load_memory(bytearray(font_file.read()), 0x0)
+    cpu.load_memory(bytearray(rom), 0x200)
+
+    cpu.run(warmup)
+    skipped = cpu.skipped
+    start = timer()
+    cpu.run(cycles)
+    elapsed = timer() - start
+    skipped = cpu.skipped - skipped
+    return (cycles - skipped) / elapsed, skipped / cycles
+
+
+def measure_startup(engine, rom: bytes) -> float:
+    """
+    Seconds from launching python until the first frame of a ROM has run
+    """
+    script = STARTUP_SCRIPT.format(module=engine.__module__, name=engine.__name__)
+    start = timer()
+    subprocess.run([sys.executable, "-c", script, rom.hex()], cwd=ROOT, check=True)
+    return timer() - start
+
+
+def summarize(runs: list, unit: str, **extra) -> dict:
+    mean = statistics.mean(runs)
+    return {
+        "unit": unit,
+        **extra,
+        "mean": mean,
+        "stdev": statistics.stdev(runs) if len(runs) > 1 else 0.0,
+        "min": min(runs),
+        "max": max(runs),
+        "runs": runs,
+    }
+
+
+def benchmark_startup(engines, repeats) -> dict:
+    results = {}
+    for engine_name in engines:
+        key = f"startup/{engine_name}"
+        result = results[key] = summarize(
+            [measure_startup(ENGINES[engine_name], WORKLOADS["alu"]) for _ in range(repeats)], "seconds"
+        )
+        print(f"{key:<24} {result['mean'] * 1000:>14,.1f} ms   +/- {result['stdev'] / result['mean'] * 100:5.1f}%", file=sys.stderr)
+    return results
+
+
+def benchmark(workloads, engines, cycles, warmup, repeats) -> dict:
+    results = {}
+    for name, rom in workloads.items():
+        for engine_name in engines:
+            key = f"{name}/{engine_name}"
+            try:
+                runs = [measure(ENGINES[engine_name], rom, cycles, warmup) for _ in range(repeats)]
+            except Exception as e:
+                print(f"{key:<24} failed: {type(e).__name__}: {e}", file=sys.stderr)
+                continue
+            skipped = statistics.mean(share for _, share in runs)
+            result = results[key] = summarize([ips for ips, _ in runs], "executed ips", skipped=skipped)
+            print(
+                f"{key:<24} {result['mean']:>14,.0f} executed ips  +/- {result['stdev'] / result['mean'] * 100:5.1f}%"
+                f"  ({skipped * 100:.1f}% of the clock skipped as idle)",
+                file=sys.stderr,
+            )
+    return results
+
+
+def format_value(value: float, unit: str) -> str:
+    """
+    A result as printed by benchmark(): cold start in milliseconds, anything else as a whole number
+    """
+    if unit == "seconds":
+        return f"{value * 1000:,.1f} ms"
+    return f"{value:,.0f}"
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Print the change of every benchmark against the baseline.
+
+    :returns:
+        names of benchmarks which got slower by more than threshold (in percent)
+    """
+    regressions = []
+    print(f"{'benchmark':<24} {'baseline':>14} {'current':>14} {'change':>8}")
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        before = baseline[key]["mean"]
+        change = (result["mean"] - before) / before * 100
+        if result.get("unit") == "seconds":
+            # less time is better
+            change = -change
+        flag = ""
+        if change < -threshold:
+            regressions.append(key)
+            flag = "  REGRESSION"
+        unit = result.get("unit")
+        print(f"{key:<24} {format_value(before, unit):>14} {format_value(result['mean'], unit):>14} {change:>+7.1f}%{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Headless benchmark suite reporting instructions actually executed per second and cold start time")
+    parser.add_argument("-w", "--workload", action="append", help="Only run this workload, 'startup' for cold start (repeatable)")
+    parser.add_argument("-e", "--engine", action="append", choices=list(ENGINES), help="Only run this engine (repeatable)")
+    parser.add_argument("-c", "--cycles", type=int, default=100_000, help="Timed instructions per run (default 100000)")
+    parser.add_argument("--warmup", type=int, default=10_000, help="Untimed instructions before every run (default 10000)")
+    parser.add_argument("-n", "--repeats", type=int, default=5, help="Runs per benchmark (default 5)")
+    parser.add_argument("-o", "--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=5.0, help="Slowdown in percent counted as regression (default 5)")
+    args = parser.parse_args()
+
+    engines = args.engine or list(ENGINES)
+    results = benchmark(
+        load_workloads(args.workload),
+        engines,
+        args.cycles,
+        args.warmup,
+        args.repeats,
+    )
+    if not args.workload or "startup" in args.workload:
+        results.update(benchmark_startup(engines, args.repeats))
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "cycles": args.cycles,
+                    "warmup": args.warmup,
+                    "repeats": args.repeats,
+                    "results": results,
+                },
+                output,
+                indent=2,
+            )
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
@@ -1,22 +1,56 @@
 #!/usr/bin/env python3
-from chip8.cpu import Chip8CPU
-from chip8.display import Chip8Display
+from chip8.cpu import Chip8CPU, CYCLES_PER_FRAME
+from chip8.quirks import PROFILES, DEFAULT_PROFILE
+from chip8.display import Chip8Display, SCALE, PALETTES
+from chip8.framebuffer import Chip8Framebuffer
+from chip8.pacing import FramePacer, FrameSkipper, FRAME_RATE
+from chip8.savestate import RewindBuffer, save_state, load_state
+from chip8.profiler import Profiler
+from chip8.trace import Tracer
+from chip8.replay import InputRecorder
+from chip8.analyzer import load_analysis, preload
+from chip8.input import PygameInput
+from chip8.shared import SharedState
+from chip8.capture import FrameRecorder
+from chip8.threaded import EmulationThread
 import pygame
 from argparse import ArgumentParser
+import atexit
+import json
+import random
+from time import perf_counter
 
 parser = ArgumentParser()
 parser.add_argument("-r", "--rom", required=True, help="ROM to load")
 parser.add_argument("-d", "--debug", help="Print debug information", action="store_true")
-parser.add_argument("-w", "--wait", default=0, help="Sleep n ms between instructions (default 0)")
+parser.add_argument("-q", "--quirks", choices=list(PROFILES), default=DEFAULT_PROFILE, help=f"Quirk profile of the CHIP-8 variant to emulate (default {DEFAULT_PROFILE})")
+parser.add_argument("-i", "--ipf", type=int, default=CYCLES_PER_FRAME, help=f"Instructions per 60 Hz frame (default {CYCLES_PER_FRAME})")
+parser.add_argument("-p", "--present-on-draw", help="Update the window after every draw instead of once per frame", action="store_true")
+parser.add_argument("--threaded", help="Run the CPU on its own thread, so a stalling window cannot slow it down", action="store_true")
+parser.add_argument("-s", "--speed", type=float, default=1.0, help="Speed relative to real time, 0 runs unthrottled (default 1)")
+parser.add_argument("-z", "--scale", type=int, default=SCALE, help=f"Window pixels per CHIP-8 pixel, half that in hi-res, changed with page up/down (default {SCALE})")
+parser.add_argument("--palette", choices=list(PALETTES), default="default", help="Colors, cycled with F2 (default: default)")
+parser.add_argument("-t", "--turbo", help="Start in turbo mode, toggled with tab", action="store_true")
+parser.add_argument("--turbo-speed", type=float, default=0.0, help="Speed in turbo mode, 0 runs unthrottled (default 0)")
+parser.add_argument("--rewind", type=int, default=0, help="Seconds of history kept for rewinding with backspace (default 0, off)")
+parser.add_argument("--profile", metavar="FILE", help="Count and time every instruction, print a summary and write it as JSON to FILE on exit")
+parser.add_argument("--trace", metavar="FILE", help="Record every instruction to a binary trace FILE, decode it with trace_dump.py")
+parser.add_argument("--seed", type=int, help="Seed for the random number generator (default random)")
+parser.add_argument("--record", metavar="FILE", help="Record keypad input to FILE for replay.py")
+parser.add_argument("--capture", metavar="FILE", help="Capture the screen to FILE: .gif, .png (numbered sequence) or raw RGB video")
+parser.add_argument("--capture-scale", type=int, default=SCALE, help=f"Pixel size in captures (default {SCALE})")
+parser.add_argument("--share", metavar="NAME", nargs="?", const="", help="Publish the machine state in shared memory for monitor.py")
 args = parser.parse_args()
+if args.threaded and args.present_on_draw:
+    parser.error("--present-on-draw cannot be combined with --threaded")
 
-screen = Chip8Display()
-cpu = Chip8CPU(screen, args.debug)
+# pick the seed here so recordings know it
+seed = args.seed if args.seed is not None else random.randrange(1 << 32)
 
-# Timer for delay and sound timer.
-# Chip8 expects timers to decrement at 60Hz which is ~17ms
-TIMER_EVENT = pygame.USEREVENT
-pygame.time.set_timer(TIMER_EVENT, 17)
+screen = Chip8Display(args.present_on_draw, args.scale, PALETTES[args.palette])
+# threaded, the CPU draws off screen and finished frames are copied to the window
+cpu = Chip8CPU(Chip8Framebuffer() if args.threaded else screen, args.debug, args.ipf, seed, args.quirks)
+keyboard = PygameInput(cpu)
 
 # load font
 with open('font.ch8', "rb") as font_file:
@@ -28,8 +62,184 @@ with open(args.rom, "rb") as rom_file:
     rom = bytearray(rom_file.read())
     cpu.load_memory(rom, 0x200)
 
-# main loop
-while True:
-    pygame.time.wait(int(args.wait))
-    cpu.handle_events(pygame.event.get())
-    cpu.execute_instr()
\ No newline at end of file
+# decode all instructions found by static analysis up front, the analysis is cached on disk
+preload(cpu, load_analysis(bytes(rom)))
+
+# F5 saves the machine state next to the ROM, F9 loads it again
+state_file = args.rom + ".state"
+rewind = RewindBuffer(args.rewind * FRAME_RATE) if args.rewind else None
+
+if args.profile:
+    profiler = Profiler(cpu)
+    profiler.enable()
+
+    def write_profile():
+        print(profiler.table())
+        with open(args.profile, "w") as f:
+            json.dump(profiler.report(), f, indent=2)
+
+    atexit.register(write_profile)
+
+if args.trace:
+    tracer = Tracer(cpu, stream=open(args.trace, "wb"))
+    tracer.enable()
+    atexit.register(tracer.flush)
+
+recorder = None
+if args.record:
+    recorder = InputRecorder(cpu, bytes(rom), seed)
+    atexit.register(recorder.save, args.record)
+
+shared = None
+if args.share is not None:
+    shared = SharedState(cpu, args.share or None)
+    print(f"Sharing machine state as {shared.name}, watch it with ./monitor.py {shared.name}")
+    atexit.register(shared.close)
+
+capture = None
+if args.capture:
+    capture = FrameRecorder(args.capture, screen.width, screen.height, args.capture_scale, screen.palette)
+
+    def finish_capture():
+        frames = capture.close()
+        print(f"Captured {frames} frames to {args.capture} ({capture.format}), {capture.dropped} screens dropped")
+
+    atexit.register(finish_capture)
+
+
+def set_turbo(enabled: bool):
+    """
+    Turbo runs at the turbo speed and presents only as many frames as the host can show.
+    Presenting on every draw would slow it down, so that is off while in turbo.
+    """
+    pacer.set_speed(args.turbo_speed if enabled else args.speed)
+    screen.present_on_draw = args.present_on_draw and not enabled
+    pygame.display.set_caption("CHIP8 (turbo)" if enabled else "CHIP8")
+
+
+def rewinding() -> bool:
+    return rewind is not None and pygame.K_BACKSPACE in keyboard.pressed_keys
+
+
+def emulate_frame():
+    """
+    Run (or rewind) one frame and hand it to everything following the machine
+    """
+    if rewinding():
+        rewind.rewind(cpu)
+        if recorder is not None:
+            recorder.rewound()
+    else:
+        if recorder is not None:
+            recorder.record_input()
+        cpu.run_frame()
+        if recorder is not None:
+            recorder.record_frame()
+        if rewind is not None:
+            rewind.push(cpu)
+    if shared is not None:
+        shared.publish()
+    if capture is not None:
+        capture.record(cpu.display)
+
+
+def save_to_file():
+    with open(state_file, "wb") as f:
+        f.write(save_state(cpu))
+
+
+def load_from_file():
+    with open(state_file, "rb") as f:
+        load_state(cpu, f.read())
+    if recorder is not None:
+        recorder.restarted()
+        # the recording cannot go back to before the load, neither can rewinding
+        if rewind is not None:
+            rewind.clear()
+
+
+def handle_hotkeys(events, machine):
+    """
+    Frontend keys. Anything touching the machine goes through machine(function),
+    which runs it right away or, threaded, on the emulation thread between frames.
+    """
+    global turbo, palette
+    for event in events:
+        if event.type != pygame.KEYDOWN:
+            continue
+        if event.key == pygame.K_F5:
+            machine(save_to_file)
+        elif event.key == pygame.K_F9:
+            machine(load_from_file)
+        elif event.key == pygame.K_TAB:
+            turbo = not turbo
+            set_turbo(turbo)
+        elif event.key in (pygame.K_PAGEUP, pygame.K_PAGEDOWN):
+            screen.set_scale(screen.scale + (1 if event.key == pygame.K_PAGEUP else -1))
+        elif event.key == pygame.K_F2:
+            names = list(PALETTES)
+            palette = names[(names.index(palette) + 1) % len(names)]
+            screen.set_palette(*PALETTES[palette])
+
+
+# Timers follow the virtual clock, the pacer only decides how fast frames pass in real time.
+pacer = FramePacer(args.speed)
+skipper = FrameSkipper()
+turbo = args.turbo
+set_turbo(turbo)
+palette = args.palette
+
+if args.threaded:
+    # the CPU runs frames on its own thread, this one handles events and presents the newest frame at 60 Hz
+    emulator = EmulationThread(cpu, emulate_frame, pacer)
+    keyboard = PygameInput(emulator)
+    # registered last so it runs first on exit, before anything the emulation thread uses is closed
+    atexit.register(emulator.stop)
+    emulator.start()
+
+    refresh = FramePacer()
+    shown = None
+    # wall time and frame of the last turbo speed measurement
+    measured = (perf_counter(), cpu.frame)
+    # until the program exits (SUPER-CHIP 00FD) or the window is closed
+    while not cpu.exited:
+        events = pygame.event.get()
+        keyboard.handle_events(events)
+        handle_hotkeys(events, emulator.call)
+        if emulator.error is not None:
+            raise emulator.error
+
+        frame = emulator.frames.latest
+        if frame is not shown:
+            screen.load_rows(frame[2], frame[1])
+            screen.present()
+            shown = frame
+        now = perf_counter()
+        if turbo and now - measured[0] >= 1:
+            speed = (cpu.frame - measured[1]) / ((now - measured[0]) * FRAME_RATE)
+            pygame.display.set_caption(f"CHIP8 (turbo x{speed:.1f})")
+            measured = (now, cpu.frame)
+        refresh.wait()
+    exit()
+
+# main loop, events are handled on every presented frame.
+present = True
+while not cpu.exited:
+    if present:
+        if cpu.waiting_for_key() and not rewinding():
+            # sleep until something happens instead of running idle frames
+            events = [pygame.event.wait()] + pygame.event.get()
+        else:
+            events = pygame.event.get()
+        keyboard.handle_events(events)
+        handle_hotkeys(events, lambda function: function())
+
+    emulate_frame()
+
+    # in turbo, frames the host has no time to show are skipped
+    present = not turbo or skipper.due()
+    if present:
+        screen.present()
+        if turbo:
+            pygame.display.set_caption(f"CHIP8 (turbo x{skipper.speed:.1f})")
+    pacer.wait()
\ No newline at end of file
@@ -0,0 +1,187 @@
+from chip8.cpu_exception import OpcodeNotImplementedException
+from chip8.translator import Chip8TranslatingCPU
+import hashlib
+import json
+import os
+
+# bumped whenever the analysis changes, older cache files are ignored
+VERSION = 2
+
+CACHE_DIR = os.environ.get("CHIP8_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "chip8py"))
+
+
+def successors(opcode: int, pc: int):
+    """
+    Addresses execution can continue at after the instruction at pc.
+
+    :returns:
+        (list of addresses, whether the instruction is understood)
+    """
+    next_pc = pc + 2
+    nnn = opcode & 0x0FFF
+    kind = opcode >> 12
+    if opcode == 0x00E0:
+        return [next_pc], True
+    if opcode in (0x00EE, 0x00FD):
+        # return, SUPER-CHIP exit
+        return [], True
+    if opcode & 0xFFF0 == 0x00C0 or opcode in (0x00FB, 0x00FC, 0x00FE, 0x00FF):
+        # SUPER-CHIP scrolling and resolution switches
+        return [next_pc], True
+    if kind == 0x1:
+        return [nnn], True
+    if kind == 0x2:
+        # the subroutine is assumed to return
+        return [nnn, next_pc], True
+    if kind in (0x3, 0x4) or (kind in (0x5, 0x9) and opcode & 0xF == 0) or \
+            (kind == 0xE and opcode & 0xFF in (0x9E, 0xA1)):
+        return [next_pc, next_pc + 2], True
+    if kind == 0xB:
+        # target depends on V0, not followed
+        return [], True
+    if kind in (0x6, 0x7, 0xA, 0xC, 0xD) or (kind == 0x8 and opcode & 0xF in (0, 1, 2, 3, 4, 5, 6, 7, 0xE)):
+        return [next_pc], True
+    if kind == 0xF and opcode & 0xFF in (0x07, 0x0A, 0x15, 0x18, 0x1E, 0x29, 0x30, 0x33, 0x55, 0x65, 0x75, 0x85):
+        return [next_pc], True
+    return [], False
+
+
+def analyze(rom: bytes, origin: int = 0x200) -> dict:
+    """
+    Walk a ROM from its entry point, following jumps, calls and skips.
+    Everything reachable is code, the rest of the ROM is treated as data.
+    I is tracked through every basic block to find stores (Fx33, Fx55) which overwrite code.
+    The result only holds plain values so it can be stored as JSON.
+    """
+    end = origin + len(rom)
+
+    def fetch(pc):
+        return (rom[pc - origin] << 8) | rom[pc - origin + 1]
+
+    code = {}
+    edges = {}
+    leaders = {origin}
+    invalid = []
+    indirect = []
+    external = set()
+    pending = [origin]
+    while pending:
+        pc = pending.pop()
+        if pc in code:
+            continue
+        if not origin <= pc < end - 1:
+            external.add(pc)
+            continue
+
+        opcode = fetch(pc)
+        code[pc] = opcode
+        targets, known = successors(opcode, pc)
+        if not known:
+            invalid.append(pc)
+        if opcode >> 12 == 0xB:
+            indirect.append(pc)
+        edges[pc] = targets
+        if targets != [pc + 2]:
+            # anything but straight-line flow ends a basic block
+            leaders.update(targets)
+        pending.extend(targets)
+
+    # follow I through every basic block in address order to find stores into code
+    code_bytes = set(code) | {pc + 1 for pc in code}
+    self_modifying = []
+    unknown_writes = []
+    I = None
+    for pc in sorted(code):
+        if pc in leaders or pc - 2 not in code or edges[pc - 2] != [pc]:
+            I = None
+        opcode = code[pc]
+        x = (opcode & 0x0F00) >> 8
+        if opcode >> 12 == 0xA:
+            I = opcode & 0x0FFF
+        elif opcode & 0xF0FF in (0xF033, 0xF055):
+            length = 3 if opcode & 0xFF == 0x33 else x + 1
+            if I is None:
+                unknown_writes.append(pc)
+            elif any(address in code_bytes for address in range(I, I + length)):
+                self_modifying.append([pc, I])
+            if opcode & 0xFF == 0x55 and I is not None:
+                I += x + 1
+        elif opcode & 0xF0FF == 0xF065 and I is not None:
+            I += x + 1
+        elif opcode & 0xF0FF in (0xF01E, 0xF029, 0xF030):
+            I = None
+
+    # ranges of the ROM never reached as code
+    data = []
+    start = None
+    for address in range(origin, end):
+        if address in code_bytes:
+            if start is not None:
+                data.append([start, address])
+                start = None
+        elif start is None:
+            start = address
+    if start is not None:
+        data.append([start, end])
+
+    return {
+        "version": VERSION,
+        "sha256": hashlib.sha256(rom).hexdigest(),
+        "origin": origin,
+        "code": sorted(code),
+        "edges": [[pc, edges[pc]] for pc in sorted(edges)],
+        "leaders": sorted(leader for leader in leaders if leader in code),
+        "opcodes": sorted(set(code.values())),
+        "data": data,
+        "self_modifying": self_modifying,
+        "unknown_writes": unknown_writes,
+        "indirect_jumps": indirect,
+        "invalid": invalid,
+        "external": sorted(external),
+    }
+
+
+def load_analysis(rom: bytes, origin: int = 0x200, cache_dir: str = CACHE_DIR) -> dict:
+    """
+    Analysis of a ROM from the disk cache, keyed by the ROM's SHA-256.
+    Analyzes and stores the ROM if it is not cached yet. A cache which cannot be written is skipped.
+    """
+    digest = hashlib.sha256(rom).hexdigest()
+    path = os.path.join(cache_dir, f"{digest}-{origin:x}.json")
+    try:
+        with open(path) as f:
+            analysis = json.load(f)
+        if analysis.get("version") == VERSION:
+            return analysis
+    except (OSError, ValueError):
+        pass
+
+    analysis = analyze(rom, origin)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # write to a temporary file first, other processes may be reading the cache
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(analysis, f)
+        os.replace(temp_path, path)
+    except OSError:
+        pass
+    return analysis
+
+
+def preload(cpu, analysis: dict):
+    """
+    Fill the CPU's decode cache with every opcode found in the ROM, so nothing gets decoded while running.
+    The block translator also compiles every basic block up front. Call after the ROM is loaded.
+    """
+    for opcode in analysis["opcodes"]:
+        if opcode not in cpu.op_cache:
+            try:
+                cpu.op_cache[opcode] = cpu.decode(opcode)
+            except OpcodeNotImplementedException:
+                pass
+
+    if isinstance(cpu, Chip8TranslatingCPU):
+        for start in analysis["leaders"]:
+            if start not in cpu.blocks:
+                cpu.translate(start)
@@ -0,0 +1,320 @@
+from chip8.pacing import FRAME_RATE
+from abc import ABC, abstractmethod
+from queue import Queue, Full
+from threading import Thread
+import os
+import struct
+import zlib
+
+# snapshots waiting for the encoder, newer ones are dropped while it is full
+QUEUE_SIZE = 256
+
+# GIF delays are in 1/100 s and viewers slow down anything shorter than 2/100 s,
+# so screens shown for less than that are merged into the next one
+GIF_MIN_DELAY = 2
+
+
+def expand_bits(scale: int, one, zero) -> list:
+    """
+    Table turning a byte of pixels into its 8 * scale pixels, each pixel made of one or zero (bytes or str)
+    """
+    return [
+        one[:0].join((one if byte & (0x80 >> bit) else zero) * scale for bit in range(8))
+        for byte in range(256)
+    ]
+
+
+def lzw_encode(pixels: bytes, min_code_size: int) -> bytes:
+    """
+    Variable-length LZW as used by GIF, output packed least significant bit first
+    """
+    clear = 1 << min_code_size
+    end = clear + 1
+    out = bytearray()
+
+    # strings are known by the code of their prefix and their last pixel: prefix << 8 | pixel -> code
+    codes = {}
+    next_code = end + 1
+    size = min_code_size + 1
+    buffer = clear
+    bits = size
+    prefix = pixels[0]
+    for pixel in pixels[1:]:
+        key = prefix << 8 | pixel
+        code = codes.get(key)
+        if code is not None:
+            prefix = code
+            continue
+
+        buffer |= prefix << bits
+        bits += size
+        while bits >= 8:
+            out.append(buffer & 0xFF)
+            buffer >>= 8
+            bits -= 8
+
+        if next_code == 4096:
+            # table is full, start over
+            buffer |= clear << bits
+            bits += size
+            codes = {}
+            next_code = end + 1
+            size = min_code_size + 1
+        else:
+            codes[key] = next_code
+            if next_code == 1 << size:
+                size += 1
+            next_code += 1
+        prefix = pixel
+
+    buffer |= prefix << bits
+    bits += size
+    buffer |= end << bits
+    bits += size
+    while bits > 0:
+        out.append(buffer & 0xFF)
+        buffer >>= 8
+        bits -= 8
+    return bytes(out)
+
+
+class ImageWriter(ABC):
+    """
+    Base of the capture formats: lays screens out on images of a fixed size.
+    The size follows the screen the capture started with; a SUPER-CHIP hi-res screen gets pixels half as big
+    (rounded down, the rest of the image stays blank).
+    """
+
+    def __init__(self, width: int, height: int, scale: int):
+        self.width = width
+        self.height = height
+        self.scale = scale
+        self.size = (width * scale, height * scale)
+        # pixel size -> table from a byte of pixels to its image pixels
+        self.tables = {}
+
+    @abstractmethod
+    def expand(self, scale: int) -> list:
+        """
+        Table turning a byte of pixels into image pixels of the given size
+        """
+
+    @abstractmethod
+    def blank(self, pixels: int) -> bytes:
+        """
+        Unset image pixels, to fill an image row (always a multiple of 8)
+        """
+
+    def image_rows(self, screen: bytes, width: int) -> list:
+        """
+        Image rows for a packed screen of the given width
+        """
+        scale = self.width * self.scale // width
+        table = self.tables.get(scale)
+        if table is None:
+            table = self.tables[scale] = self.expand(scale)
+        row_bytes = width // 8
+        padding = self.blank(self.size[0] - width * scale)
+        rows = []
+        for offset in range(0, len(screen), row_bytes):
+            rows.extend([b"".join(table[byte] for byte in screen[offset:offset + row_bytes]) + padding] * scale)
+        rows.extend([self.blank(self.size[0])] * (self.size[1] - len(rows)))
+        return rows
+
+
+class GifWriter(ImageWriter):
+    """
+    Animated GIF with the two palette colors, looping forever
+    """
+
+    def __init__(self, path: str, width: int, height: int, scale: int, palette):
+        super().__init__(width, height, scale)
+        self.f = open(path, "wb")
+
+        # screen waiting for its delay to be known, with the frame it was first shown in
+        self.pending = None
+        self.shown = 0
+        # frames written so far
+        self.frames = 0
+
+        off, on = palette
+        self.f.write(b"GIF89a" + struct.pack("<HHBBB", *self.size, 0xF0, 0, 0) + bytes(off) + bytes(on))
+        # NETSCAPE2.0 extension: loop forever
+        self.f.write(b"\x21\xFF\x0BNETSCAPE2.0\x03\x01\x00\x00\x00")
+
+    def expand(self, scale: int) -> list:
+        return expand_bits(scale, b"\x01", b"\x00")
+
+    def blank(self, pixels: int) -> bytes:
+        return bytes(pixels)
+
+    def centiseconds(self, frame: int) -> int:
+        return frame * 100 // FRAME_RATE
+
+    def write(self, screen: bytes, width: int, frames: int):
+        if self.pending is not None and \
+                self.centiseconds(self.shown) - self.centiseconds(self.pending[0]) >= GIF_MIN_DELAY:
+            self.encode(*self.pending)
+            self.pending = None
+        if self.pending is None:
+            self.pending = (self.shown, screen, width)
+        else:
+            # the pending screen was too short to show, this one takes its place
+            self.pending = (self.pending[0], screen, width)
+        self.shown += frames
+
+    def encode(self, start: int, screen: bytes, width: int):
+        delay = self.centiseconds(self.shown) - self.centiseconds(start)
+        data = lzw_encode(b"".join(self.image_rows(screen, width)), 2)
+
+        self.f.write(struct.pack("<BBBBHB", 0x21, 0xF9, 4, 0, delay, 0) + b"\x00")
+        self.f.write(b"\x2C" + struct.pack("<HHHHB", 0, 0, *self.size, 0) + b"\x02")
+        for offset in range(0, len(data), 255):
+            block = data[offset:offset + 255]
+            self.f.write(bytes((len(block),)) + block)
+        self.f.write(b"\x00")
+        self.frames += 1
+
+    def close(self):
+        if self.pending is not None:
+            self.encode(*self.pending)
+        self.f.write(b"\x3B")
+        self.f.close()
+
+
+class PngWriter(ImageWriter):
+    """
+    One PNG per frame, numbered through a printf-style pattern like capture-%06d.png
+    """
+
+    def __init__(self, pattern: str, width: int, height: int, scale: int, palette):
+        super().__init__(width, height, scale)
+        self.pattern = pattern
+        self.frames = 0
+        off, on = palette
+        self.header = b"\x89PNG\r\n\x1a\n" + \
+            self.chunk(b"IHDR", struct.pack(">IIBBBBB", *self.size, 1, 3, 0, 0, 0)) + \
+            self.chunk(b"PLTE", bytes(off) + bytes(on))
+
+    def expand(self, scale: int) -> list:
+        # two-color palette image with one bit per pixel
+        return [int(row, 2).to_bytes(scale, "big") for row in expand_bits(scale, "1", "0")]
+
+    def blank(self, pixels: int) -> bytes:
+        return bytes(pixels // 8)
+
+    @staticmethod
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    def write(self, screen: bytes, width: int, frames: int):
+        image = b"".join(b"\x00" + row for row in self.image_rows(screen, width))
+        png = self.header + self.chunk(b"IDAT", zlib.compress(image)) + self.chunk(b"IEND", b"")
+        # a screen shown for several frames is written for each of them, so the sequence keeps the frame rate
+        for _ in range(frames):
+            self.frames += 1
+            with open(self.pattern % self.frames, "wb") as f:
+                f.write(png)
+
+    def close(self):
+        pass
+
+
+class RawWriter(ImageWriter):
+    """
+    Raw RGB24 video, one full image per frame, for tools like ffmpeg
+    """
+
+    def __init__(self, path: str, width: int, height: int, scale: int, palette):
+        super().__init__(width, height, scale)
+        self.f = open(path, "wb")
+        self.frames = 0
+        self.palette = tuple(bytes(color) for color in palette)
+
+    def expand(self, scale: int) -> list:
+        off, on = self.palette
+        return expand_bits(scale, on, off)
+
+    def blank(self, pixels: int) -> bytes:
+        return self.palette[0] * pixels
+
+    def write(self, screen: bytes, width: int, frames: int):
+        image = b"".join(self.image_rows(screen, width))
+        for _ in range(frames):
+            self.f.write(image)
+        self.frames += frames
+
+    def close(self):
+        self.f.close()
+
+
+WRITERS = {"gif": GifWriter, "png": PngWriter, "raw": RawWriter}
+
+
+def capture_format(path: str) -> str:
+    """
+    Format to capture to, by file extension
+    """
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    return extension if extension in WRITERS else "raw"
+
+
+class FrameRecorder(object):
+    """
+    Captures the screen to a GIF, a PNG sequence or raw RGB video without holding up emulation.
+    record() only copies the packed framebuffer (256 bytes, 1024 in hi-res) into a bounded queue, and only when the screen changed.
+    Scaling, palette mapping and encoding happen on a background thread.
+    If the encoder falls behind, screens are dropped and counted instead of waiting for it;
+    the previous screen is then shown for longer, so the capture keeps in time.
+    """
+
+    def __init__(self, path: str, width: int, height: int, scale: int, palette, fmt: str = None):
+        self.path = path
+        self.format = fmt or capture_format(path)
+        if self.format == "png" and "%" not in path:
+            base, extension = os.path.splitext(path)
+            path = f"{base}-%06d{extension}"
+        self.writer = WRITERS[self.format](path, width, height, scale, palette)
+
+        self.queue = Queue(QUEUE_SIZE)
+        # frames recorded so far
+        self.frame = 0
+        self.screen = None
+        self.dropped = 0
+        self.thread = Thread(target=self.encode, name="capture", daemon=True)
+        self.thread.start()
+
+    def record(self, display):
+        """
+        Call once per frame
+        """
+        screen = display.to_bytes()
+        if screen != self.screen:
+            try:
+                self.queue.put_nowait((self.frame, screen, display.width))
+                self.screen = screen
+            except Full:
+                self.dropped += 1
+        self.frame += 1
+
+    def encode(self):
+        previous = None
+        while True:
+            frame, screen, width = self.queue.get()
+            if previous is not None:
+                self.writer.write(previous[1], previous[2], frame - previous[0])
+            if screen is None:
+                break
+            previous = (frame, screen, width)
+        self.writer.close()
+
+    def close(self) -> int:
+        """
+        Wait for the encoder to finish and close the output
+
+        :returns:
+            frames written
+        """
+        self.queue.put((self.frame, None, None))
+        self.thread.join()
+        return self.writer.frames
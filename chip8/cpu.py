@@ -1,36 +1,47 @@
-from chip8.cpu_exception import OpcodeNotImplementedException
-from chip8.display import Chip8Display
-from random import randint
-from math import floor
-import pygame
+from chip8.cpu_exception import OpcodeNotImplementedException, IdleLoopException
+from chip8.framebuffer import Chip8Framebuffer, WIDTH, HEIGHT, HIRES_WIDTH, HIRES_HEIGHT
+from chip8.quirks import DEFAULT_PROFILE, get_profile, handler_table
+from functools import partial
+from random import Random
 
 MEMORY_SIZE = 4069
-TIMER_EVENT = pygame.USEREVENT
-KEY_MAPPINGS = {
-    0x1: pygame.K_1,
-    0x2: pygame.K_2,
-    0x3: pygame.K_3,
-    0xC: pygame.K_4,
-    0x4: pygame.K_q,
-    0x5: pygame.K_w,
-    0x6: pygame.K_e,
-    0xD: pygame.K_r,
-    0x7: pygame.K_a,
-    0x8: pygame.K_s,
-    0x9: pygame.K_d,
-    0xE: pygame.K_f,
-    0xA: pygame.K_y,
-    0x0: pygame.K_x,
-    0xB: pygame.K_c,
-    0xF: pygame.K_v,
-}
-
-KEY_MAPPINGS_INVERSE = {v: k for k, v in KEY_MAPPINGS.items()}
+# instructions executed per virtual 60 Hz frame
+CYCLES_PER_FRAME = 12
+# keys as laid out on the keypad, Fx0A takes the first pressed key in this order
+KEY_ORDER = (0x1, 0x2, 0x3, 0xC, 0x4, 0x5, 0x6, 0xD, 0x7, 0x8, 0x9, 0xE, 0xA, 0x0, 0xB, 0xF)
+
+# SUPER-CHIP 8x10 digits for Fx30 (A-F as on XO-CHIP), put into memory behind the reach of Fx29
+BIG_FONT_ADDRESS = 0xA0
+BIG_FONT = bytes((
+    0xFF, 0xFF, 0xC3, 0xC3, 0xC3, 0xC3, 0xC3, 0xC3, 0xFF, 0xFF,  # 0
+    0x18, 0x78, 0x78, 0x18, 0x18, 0x18, 0x18, 0x18, 0xFF, 0xFF,  # 1
+    0xFF, 0xFF, 0x03, 0x03, 0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF,  # 2
+    0xFF, 0xFF, 0x03, 0x03, 0xFF, 0xFF, 0x03, 0x03, 0xFF, 0xFF,  # 3
+    0xC3, 0xC3, 0xC3, 0xC3, 0xFF, 0xFF, 0x03, 0x03, 0x03, 0x03,  # 4
+    0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF, 0x03, 0x03, 0xFF, 0xFF,  # 5
+    0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF, 0xC3, 0xC3, 0xFF, 0xFF,  # 6
+    0xFF, 0xFF, 0x03, 0x03, 0x06, 0x0C, 0x18, 0x18, 0x18, 0x18,  # 7
+    0xFF, 0xFF, 0xC3, 0xC3, 0xFF, 0xFF, 0xC3, 0xC3, 0xFF, 0xFF,  # 8
+    0xFF, 0xFF, 0xC3, 0xC3, 0xFF, 0xFF, 0x03, 0x03, 0xFF, 0xFF,  # 9
+    0x7E, 0xFF, 0xC3, 0xC3, 0xC3, 0xFF, 0xFF, 0xC3, 0xC3, 0xC3,  # A
+    0xFC, 0xFC, 0xC3, 0xC3, 0xFC, 0xFC, 0xC3, 0xC3, 0xFC, 0xFC,  # B
+    0x3C, 0xFF, 0xC3, 0xC0, 0xC0, 0xC0, 0xC0, 0xC3, 0xFF, 0x3C,  # C
+    0xFC, 0xFE, 0xC3, 0xC3, 0xC3, 0xC3, 0xC3, 0xC3, 0xFE, 0xFC,  # D
+    0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF,  # E
+    0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF, 0xC0, 0xC0, 0xC0, 0xC0,  # F
+))
+# pixels 00FB and 00FC scroll by
+SCROLL_PIXELS = 4
 
 class Chip8CPU:
-    def __init__(self, display: Chip8Display, debug: bool = False):
+    def __init__(self, display: Chip8Framebuffer, debug: bool = False, cycles_per_frame: int = CYCLES_PER_FRAME, seed=None,
+                 quirks: str = DEFAULT_PROFILE):
         self.display = display
         self.debug = debug
+        self.cycles_per_frame = cycles_per_frame
+
+        # random numbers for Cxnn, seeded for reproducible runs
+        self.random = Random(seed)
 
         # initialize the 16 general purpose registers (v0 - vF) (8 bit)
         self.v = []
@@ -51,130 +62,287 @@ class Chip8CPU:
         # initialize stack (should be 16 x 16 bit)
         self.stack = []
 
-        # initialize timers
+        # initialize timers.
+        # Timers are not counted down one by one, see get_timer()
         self.timers = {"delay": 0x0, "sound": 0x0}
+        self.timer_frames = {"delay": 0, "sound": 0}
+
+        # virtual clock: frames passed and instructions executed in the current frame
+        self.frame = 0
+        self.frame_cycle = 0
 
-        # current operand
+        # current operand (only tracked when debugging)
         self.operand = 0x0
 
         # initialize RAM
         self.memory = bytearray(MEMORY_SIZE)
 
-        # set pressed keys
-        self.pressed_keys = []
+        # pressed keys as bitmask (bit n = key n), updated by an input backend (see chip8/input.py)
+        self.keypad = 0
+
+        # key pressed while waiting in Fx0A, stored once it gets released
+        self.key_wait = None
+
+        # instructions executed by the last execute() call which raised
+        self.executed = 0
+
+        # instructions counted on the virtual clock but skipped by idle loop detection instead of being run
+        self.skipped = 0
 
-        # cache for decoded instructions
+        # SUPER-CHIP RPL user flags, written by Fx75 and read back by Fx85.
+        # On the HP48 they survive the program, so they are not part of the machine state.
+        self.rpl = [0] * 16
+
+        # set once the program stopped itself with 00FD
+        self.exited = False
+
+        # cache for decoded instructions (opcode -> handler with operands bound)
         self.op_cache = {}
 
+        # handlers with additional debug output, these replace the regular ones when debugging
+        self.debug_instrs = {
+            "instr_ret": self.debug_instr_ret,
+            "instr_drw": self.debug_instr_drw,
+            "instr_drw_wrap": self.debug_instr_drw,
+            "instr_skp": self.debug_instr_skp,
+        }
+        if debug:
+            self.execute_instr = self.execute_instr_debug
+
+        # instructions which differ between CHIP-8 variants get the handlers of the quirk profile (see chip8/quirks.py),
+        # bound once here so decoding and the handlers themselves never look at a quirk
+        self.quirk_profile = quirks
+        self.quirks = get_profile(quirks)
+        for name, method in handler_table(self.quirks).items():
+            setattr(self, name, getattr(self, method))
+        if self.quirks["extended"]:
+            self.memory[BIG_FONT_ADDRESS:BIG_FONT_ADDRESS + len(BIG_FONT)] = BIG_FONT
+
     def execute_instr(self):
         """
-        Execute next instruction and handle keyboard events
+        Execute next instruction.
+        Raises IdleLoopException when the program idles, see execute() for skipping ahead.
         """
-        # get first byte of next instruction from memory
-        self.operand = self.memory[self.pc] << 8
-
-        # get second byte of next instruction from memory
-        self.operand += self.memory[self.pc + 1]
+        # fetch next instruction from memory
+        opcode = (self.memory[self.pc] << 8) | self.memory[self.pc + 1]
 
         # increment program counter by two bytes
         self.pc += 2
 
-        if self.debug:
-            print("-----")
-            print(
-                f"Executing: {hex(self.operand)}"
-            )
-            print(f"PC: {self.pc}")
-
-        # execute opcode from cache and return if cached 
-        if self.operand in self.op_cache:
-            self.op_cache[self.operand]()
-            return
+        # execute opcode from cache, decode and add to cache if not cached yet
+        instr = self.op_cache.get(opcode)
+        if instr is None:
+            instr = self.op_cache[opcode] = self.decode(opcode)
+        instr()
+
+    def run(self, cycles: int):
+        """
+        Execute the given number of instructions on the virtual clock.
+        Every cycles_per_frame instructions a 60 Hz frame passes, no matter how fast the host is.
+        No events are handled in between, call handle_events() before or after.
+        """
+        while cycles > 0:
+            batch = min(cycles, self.cycles_per_frame - self.frame_cycle)
+            try:
+                self.execute(batch)
+            except Exception:
+                # the failing instruction counts as executed, so the clock stays in step with the PC
+                self.tick(self.executed)
+                raise
+            cycles -= batch
+            self.tick(batch)
+
+    def tick(self, cycles: int):
+        """
+        Advance the virtual clock by the given number of instructions (within the current frame)
+        """
+        self.frame_cycle += cycles
+        if self.frame_cycle >= self.cycles_per_frame:
+            self.frame_cycle = 0
+            self.frame += 1
+
+    def execute(self, cycles: int):
+        """
+        Execute the given number of instructions without looking at the clock.
+        If an instruction raises, self.executed holds the number of instructions up to and including it.
+        """
+        i = 0
+        try:
+            if self.debug:
+                for i in range(cycles):
+                    self.execute_instr()
+                return
+
+            # keep everything needed on the hot path in local variables
+            memory = self.memory
+            op_cache = self.op_cache
+            decode = self.decode
+            for i in range(cycles):
+                pc = self.pc
+                opcode = (memory[pc] << 8) | memory[pc + 1]
+                self.pc = pc + 2
+
+                instr = op_cache.get(opcode)
+                if instr is None:
+                    instr = op_cache[opcode] = decode(opcode)
+                instr()
+        except IdleLoopException as idle:
+            # nothing changes until the frame is over, skip all whole passes through the loop
+            remaining = cycles - i - 1
+            self.skipped += remaining - remaining % idle.length
+            self.execute(remaining % idle.length)
+        except Exception:
+            self.executed = i + 1
+            raise
+
+    @property
+    def cycles(self) -> int:
+        """
+        Instructions executed since power-on according to the virtual clock
+        """
+        return self.frame * self.cycles_per_frame + self.frame_cycle
+
+    def run_frame(self):
+        """
+        Execute instructions until the current frame is over
+        """
+        self.run(self.cycles_per_frame - self.frame_cycle)
+
+    def execute_instr_debug(self):
+        """
+        Execute next instruction and print debug information
+        """
+        self.operand = (self.memory[self.pc] << 8) | self.memory[self.pc + 1]
+        self.pc += 2
 
+        print("-----")
+        print(
+            f"Executing: {hex(self.operand)}"
+        )
+        print(f"PC: {self.pc}")
+
+        instr = self.op_cache.get(self.operand)
+        if instr is None:
+            instr = self.op_cache[self.operand] = self.decode(self.operand)
+        instr()
+
+    def decode(self, opcode: int):
+        """
+        Decode opcode into a handler with its operands bound.
+        The returned handler does not need to look at the opcode again.
+        """
         # split operand into nibbles
         operand_nibbles = (
-            (self.operand & 0xF000) >> 12,
-            (self.operand & 0x0F00) >> 8,
-            (self.operand & 0x00F0) >> 4,
-            (self.operand & 0x000F),
+            (opcode & 0xF000) >> 12,
+            (opcode & 0x0F00) >> 8,
+            (opcode & 0x00F0) >> 4,
+            (opcode & 0x000F),
         )
-        
-        # decode, execute and add to cache
-        instr = None
+        x = operand_nibbles[1]
+        y = operand_nibbles[2]
+        n = operand_nibbles[3]
+        nn = opcode & 0x00FF
+        nnn = opcode & 0x0FFF
+        # SUPER-CHIP instructions only exist on profiles which have them
+        extended = self.quirks["extended"]
+
         match operand_nibbles:
             case (0x0, 0x0, 0xE, 0x0):  # 00E0 (clear screen)
-                instr = self.instr_cls
+                instr, args = self.instr_cls, ()
             case (0x0, 0x0, 0xE, 0xE):  # 00EE (return from subroutine)
-                instr = self.instr_ret
+                instr, args = self.instr_ret, ()
+            case (0x0, 0x0, 0xC, _) if extended:  # 00Cn (scroll down n rows)
+                instr, args = self.instr_scd, (n,)
+            case (0x0, 0x0, 0xF, 0xB) if extended:  # 00FB (scroll right 4 pixels)
+                instr, args = self.instr_scr, ()
+            case (0x0, 0x0, 0xF, 0xC) if extended:  # 00FC (scroll left 4 pixels)
+                instr, args = self.instr_scl, ()
+            case (0x0, 0x0, 0xF, 0xD) if extended:  # 00FD (exit)
+                instr, args = self.instr_exit, ()
+            case (0x0, 0x0, 0xF, 0xE) if extended:  # 00FE (low-res mode)
+                instr, args = self.instr_low, ()
+            case (0x0, 0x0, 0xF, 0xF) if extended:  # 00FF (hi-res mode)
+                instr, args = self.instr_high, ()
             case (0x1, _, _, _):  # 1xxx (jump)
-                instr = self.instr_jmp
+                instr, args = self.instr_jmp, (nnn,)
             case (0x2, _, _, _):  # 2xxx (call subroutine)
-                instr = self.instr_call
+                instr, args = self.instr_call, (nnn,)
             case (0x3, _, _, _):  # 3xyy (skip if Vx == yy)
-                instr = self.instr_se_vx_byte
+                instr, args = self.instr_se_vx_byte, (x, nn)
             case (0x4, _, _, _):  # 4xyy (skip if Vx != yy)
-                instr = self.instr_sne_vx_byte
+                instr, args = self.instr_sne_vx_byte, (x, nn)
             case (0x5, _, _, 0):  # 5xy0 (skip if Vx == Vy)
-                instr = self.instr_se_vx_vy
+                instr, args = self.instr_se_vx_vy, (x, y)
             case (0x6, _, _, _):  # 6xyy (Vx == yy)
-                instr = self.instr_ld_byte
+                instr, args = self.instr_ld_byte, (x, nn)
             case (0x7, _, _, _):  # 7xyy (Vx += yy)
-                instr = self.instr_add_byte
+                instr, args = self.instr_add_byte, (x, nn)
             case (0x8, _, _, 0x0):  # 8xy0 (Vx = Vy)
-                instr = self.instr_ld_vx_vy
+                instr, args = self.instr_ld_vx_vy, (x, y)
             case (0x8, _, _, 0x1):  # 8xy1 (Vx OR Vy)
-                instr = self.instr_or_vx_vy
+                instr, args = self.instr_or_vx_vy, (x, y)
             case (0x8, _, _, 0x2):  # 8xy2 (Vx AND Vy)
-                instr = self.instr_and_vx_vy
+                instr, args = self.instr_and_vx_vy, (x, y)
             case (0x8, _, _, 0x3):  # 8xy3 (Vx XOR Vy)
-                instr = self.instr_xor_vx_vy
+                instr, args = self.instr_xor_vx_vy, (x, y)
             case (0x8, _, _, 0x4):  # 8xy4 (Vx += Vy)
-                instr = self.instr_add_vx_vy
+                instr, args = self.instr_add_vx_vy, (x, y)
             case (0x8, _, _, 0x5):  # 8xy5 (Vx -= Vy)
-                instr = self.instr_sub_vx_vy
+                instr, args = self.instr_sub_vx_vy, (x, y)
             case (0x8, _, _, 0x6):  # 8xy6 (shift-right Vx)
-                instr = self.instr_shr_vx
+                instr, args = self.instr_shr_vx, (x, y)
             case (0x8, _, _, 0x7):  # 8xy7 (Vx = Vy - Vx)
-                instr = self.instr_subn_vy
+                instr, args = self.instr_subn_vy, (x, y)
             case (0x8, _, _, 0xE):  # 8xyE (shift-left Vx)
-                instr = self.instr_shl_vx
+                instr, args = self.instr_shl_vx, (x, y)
             case (0x9, _, _, 0x0):  # 9xy0 (skip if Vx != Vy)
-                instr = self.instr_sne_vx_vy
+                instr, args = self.instr_sne_vx_vy, (x, y)
             case (0xA, _, _, _):  # Annn (I = nnn)
-                instr = self.instr_ld_i_byte
+                instr, args = self.instr_ld_i_byte, (nnn,)
             case (0xB, _, _, _):  # Bnnn (PC = xxx + v0)
-                instr = self.instr_jmp_offset
+                instr, args = self.instr_jmp_offset, (nnn,)
             case (0xC, _, _, _):  # Cxnn (Vx = random)
-                instr = self.instr_vx_rnd
+                instr, args = self.instr_vx_rnd, (x, nn)
+            case (0xD, _, _, 0x0) if extended:  # Dxy0 (draw 16x16 sprite)
+                instr, args = self.instr_drw_large, (x, y)
             case (0xD, _, _, _):  # Dxyz (draw)
-                instr = self.instr_drw
+                instr, args = self.instr_drw, (x, y, n)
             case (0xE, _, 0x9, 0xE):  # Ex9E (skip if key with value Vx is pressed)
-                instr = self.instr_skp
+                instr, args = self.instr_skp, (x,)
             case (0xE, _, 0xA, 0x1):  # ExA1 (skip if key with value vx is not pressed)
-                instr = self.instr_sknp
+                instr, args = self.instr_sknp, (x,)
             case (0xF, _, 0x0, 0x7):  # Fx07 (Vx = delay timer)
-                instr = self.instr_ld_vx_dt
+                instr, args = self.instr_ld_vx_dt, (x,)
             case (0xF, _, 0x0, 0xA):  # Fx0A (Wait for keypress, then store in Vx)
-                instr = self.instr_ld_vx_k
+                instr, args = self.instr_ld_vx_k, (x,)
             case (0xF, _, 0x1, 0x5):  # Fx15 (delay timer = Vx)
-                instr = self.instr_ld_dt_vx
-            case (0xF, _, 0x1, 0x8):  # Fx19 (sound timer = Vx, not implemented)
-                return
+                instr, args = self.instr_ld_dt_vx, (x,)
+            case (0xF, _, 0x1, 0x8):  # Fx18 (sound timer = Vx, no sound is played)
+                instr, args = self.instr_ld_st_vx, (x,)
             case (0xF, _, 0x1, 0xE):  # Fx1E (I += Vx)
-                instr = self.instr_add_i_vx
+                instr, args = self.instr_add_i_vx, (x,)
             case (0xF, _, 0x2, 0x9):  # Fx29 (Load sprite for nibble at Vx)
-                instr = self.instr_ld_i_vx
+                instr, args = self.instr_ld_i_vx, (x,)
+            case (0xF, _, 0x3, 0x0) if extended:  # Fx30 (Load big sprite for digit at Vx)
+                instr, args = self.instr_ld_i_big_vx, (x,)
             case (0xF, _, 0x3, 0x3):  # Fx33 (Store decimal number at I)
-                instr = self.instr_ld_bcd_vx_i
+                instr, args = self.instr_ld_bcd_vx_i, (x,)
             case (0xF, _, 0x5, 0x5):  # Fx55 (Store V0 to Vx starting at I)
-                instr = self.instr_store_v0_vx
+                instr, args = self.instr_store_v0_vx, (x,)
             case (0xF, _, 0x6, 0x5):  # Fx65 (Read V0 to Vx starting at I)
-                instr = self.instr_read_v0_vx
+                instr, args = self.instr_read_v0_vx, (x,)
+            case (0xF, _, 0x7, 0x5) if extended:  # Fx75 (Store V0 to Vx in RPL flags)
+                instr, args = self.instr_store_rpl, (x,)
+            case (0xF, _, 0x8, 0x5) if extended:  # Fx85 (Read V0 to Vx from RPL flags)
+                instr, args = self.instr_read_rpl, (x,)
             case _:  # unknown opcode, raise exception
                 raise OpcodeNotImplementedException((operand_nibbles, self.pc - 0x200))
-            
-        instr()
-        self.op_cache[self.operand] = instr
+
+        if self.debug:
+            instr = self.debug_instrs.get(instr.__name__, instr)
+        if args:
+            return partial(instr, *args)
+        return instr
 
 
     def load_memory(self, memory: bytearray, offset: int):
@@ -186,31 +354,59 @@ class Chip8CPU:
         if (len(memory) + offset) > MEMORY_SIZE:
             raise Exception(f"Memory limit of {MEMORY_SIZE} exceeded")
 
-        for index, value in enumerate(memory):
-            self.memory[index + offset] = value
+        self.memory[offset:offset + len(memory)] = memory
+
+    def press_key(self, key: int):
+        self.keypad |= 1 << key
+
+    def release_key(self, key: int):
+        self.keypad &= ~(1 << key)
+
+    def waiting_for_key(self) -> bool:
+        """
+        True while Fx0A waits for a key and no timer is running, nothing changes before the next input event
+        """
+        opcode = (self.memory[self.pc] << 8) | self.memory[self.pc + 1]
+        return opcode & 0xF0FF == 0xF00A and self.get_timer("delay") == 0 and self.get_timer("sound") == 0
+
+    def check_idle(self, length: int):
+        """
+        Called after a jump back by length instructions.
+        Raises IdleLoopException if the program is idling: jumping to itself, or polling the delay timer with
+            Fx07 (Vx = delay timer)
+            3xnn / 4xnn (skip out of the loop once Vx reaches nn)
+            1nnn (jump back to Fx07)
+        and the next pass through the loop would not change anything this frame.
+        """
+        if length == 1:
+            raise IdleLoopException(1)
+
+        memory = self.memory
+        pc = self.pc
+        load = (memory[pc] << 8) | memory[pc + 1]
+        skip = (memory[pc + 2] << 8) | memory[pc + 3]
+        x = (load & 0x0F00) >> 8
+        if load & 0xF0FF != 0xF007 or skip >> 12 not in (0x3, 0x4) or (skip & 0x0F00) >> 8 != x:
+            return
 
-    def handle_events(self, events):
-        self.events = events
-        for event in events:
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                exit()
-            elif event.type == pygame.USEREVENT:
-                self.decrement_timers() 
-            elif event.type == pygame.KEYDOWN:
-                self.pressed_keys.append(event.key)
-            elif event.type == pygame.KEYUP:
-                self.pressed_keys.remove(event.key)
+        value = self.v[x]
+        # the loop keeps going while 3xnn does not skip (Vx != nn) or 4xnn does not skip (Vx == nn)
+        if value == self.get_timer("delay") and (value == skip & 0xFF) == (skip >> 12 == 0x4):
+            raise IdleLoopException(length)
 
-    def decrement_timers(self):
+    def get_timer(self, name: str) -> int:
         """
-        Decrease delay and sound timer by one
+        Get current value of the delay or sound timer.
+        Timers are derived from the frames passed on the virtual clock since they were set.
         """
-        # print(f"Delay: {self.timers['delay']} | Sound: {self.timers['sound']}")
-        if self.timers["delay"] > 0:
-            self.timers["delay"] -= 1
-        if self.timers["sound"] > 0:
-            self.timers["sound"] -= 1
+        return max(0, self.timers[name] - (self.frame - self.timer_frames[name]))
+
+    def set_timer(self, name: str, value: int):
+        """
+        Set the delay or sound timer, it counts down from the current frame on
+        """
+        self.timers[name] = value
+        self.timer_frames[name] = self.frame
 
     ###################
     ### CPU opcodes ###
@@ -222,367 +418,488 @@ class Chip8CPU:
         """
         self.display.clear()
 
-    # 00EE: Return from subroutine
     def instr_ret(self):
         """
         00EE: Return from subroutine
         """
-        if self.debug:
-            print("Stack before pop:")
-            print(self.stack)
         self.pc = self.stack.pop()
-        if self.debug:
-            print("Stack after pop:")
-            print(self.stack)
 
-    def instr_jmp(self):
+    def instr_scd(self, n):
+        """
+        00Cn: Scroll the screen down by n rows (of the current resolution)
+        """
+        self.display.scroll_down(n)
+        self.display.update()
+
+    def instr_scr(self):
+        """
+        00FB: Scroll the screen right by 4 pixels
+        """
+        self.display.scroll_right(SCROLL_PIXELS)
+        self.display.update()
+
+    def instr_scl(self):
+        """
+        00FC: Scroll the screen left by 4 pixels
+        """
+        self.display.scroll_left(SCROLL_PIXELS)
+        self.display.update()
+
+    def instr_exit(self):
         """
-        1xxx: Set program counter to xxx
+        00FD: Exit the interpreter.
+        The instruction repeats itself, so the machine stays put until the frontend notices self.exited.
         """
-        self.pc = self.operand & 0x0FFF
+        self.exited = True
+        self.pc -= 2
+        raise IdleLoopException(1)
 
-    def instr_call(self):
+    def instr_low(self):
+        """
+        00FE: Switch to the 64x32 low-res mode and clear the screen
+        """
+        self.display.set_resolution(WIDTH, HEIGHT)
+        self.display.update()
+
+    def instr_high(self):
+        """
+        00FF: Switch to the 128x64 hi-res mode and clear the screen
+        """
+        self.display.set_resolution(HIRES_WIDTH, HIRES_HEIGHT)
+        self.display.update()
+
+    def instr_jmp(self, nnn):
+        """
+        1xxx: Set program counter to xxx.
+        Jumps back to themselves or to a timer polling loop are checked for idling.
+        """
+        back = self.pc - nnn
+        self.pc = nnn
+        if back == 2 or back == 6:
+            self.check_idle(back // 2)
+
+    def instr_call(self, nnn):
         """
         2xxx: Call subroutine.
         Put current PC on top of stack and set PC to xxx
         """
         self.stack.append(self.pc)
-        self.pc = self.operand & 0x0FFF
+        self.pc = nnn
 
-    def instr_se_vx_byte(self):
+    def instr_se_vx_byte(self, x, yy):
         """
         3xyy: Skip next instruction if Vx = yy (increment pc by 2)
         """
-        x = (self.operand & 0x0F00) >> 8
-        yy = self.operand & 0x00FF
         if self.v[x] == yy:
             self.pc += 2
 
-    def instr_sne_vx_byte(self):
+    def instr_sne_vx_byte(self, x, yy):
         """
         4xyy: Skip next instruction if Vx != yy (increment pc by 2)
         """
-        x = (self.operand & 0x0F00) >> 8
-        yy = self.operand & 0x00FF
         if self.v[x] != yy:
             self.pc += 2
 
-    def instr_se_vx_vy(self):
+    def instr_se_vx_vy(self, x, y):
         """
         5xy0: Skip next instruction if Vx = Vy (increment pc by 2)
         """
-        x = (self.operand & 0x0F00) >> 8
-        y = (self.operand & 0x00F0) >> 4
         if self.v[x] == self.v[y]:
             self.pc += 2
 
     # 6xyy: Vx = yy
-    def instr_ld_byte(self):
-        x = (self.operand & 0x0F00) >> 8
-        self.v[x] = self.operand & 0x00FF
+    def instr_ld_byte(self, x, yy):
+        self.v[x] = yy
 
     # 7xyy: Vx += yy
-    def instr_add_byte(self):
-        x = (self.operand & 0x0F00) >> 8
-        self.v[x] += self.operand & 0x00FF
-
+    def instr_add_byte(self, x, yy):
         # handle overflow (8-bit).
-        if self.v[x] > 255:
-            self.v[x] -= 256
+        self.v[x] = (self.v[x] + yy) & 0xFF
 
-    def instr_ld_vx_vy(self):
+    def instr_ld_vx_vy(self, x, y):
         """
         8xy0: Vx = Vy
         """
-        x = (self.operand & 0x0F00) >> 8
-        y = (self.operand & 0x00F0) >> 4
         self.v[x] = self.v[y]
 
-    def instr_or_vx_vy(self):
+    def instr_or_vx_vy(self, x, y):
         """
         8xy1: Vx OR Vy, store result in Vx
         Quirk: Set VF to 0
         """
-        x = (self.operand & 0x0F00) >> 8
-        y = (self.operand & 0x00F0) >> 4
+        v = self.v
+        v[x] |= v[y]
+        v[0xF] = 0
+
+    def instr_or_vx_vy_keep_vf(self, x, y):
+        """
+        8xy1 without the VF reset quirk
+        """
         self.v[x] |= self.v[y]
-        self.v[0xF] = 0
 
-    def instr_and_vx_vy(self):
+    def instr_and_vx_vy(self, x, y):
         """
         8xy2: Vx AND Vy, store result in Vx
         Quirk: Set VF to 0
         """
-        x = (self.operand & 0x0F00) >> 8
-        y = (self.operand & 0x00F0) >> 4
+        v = self.v
+        v[x] &= v[y]
+        v[0xF] = 0
+
+    def instr_and_vx_vy_keep_vf(self, x, y):
+        """
+        8xy2 without the VF reset quirk
+        """
         self.v[x] &= self.v[y]
-        self.v[0xF] = 0
 
-    def instr_xor_vx_vy(self):
+    def instr_xor_vx_vy(self, x, y):
         """
         8xy3: Vx XOR Vy, store result in Vx
         Quirk: Set VF to 0
         """
-        x = (self.operand & 0x0F00) >> 8
-        y = (self.operand & 0x00F0) >> 4
-        self.v[x] = self.v[x] ^ self.v[y]
-        self.v[0xF] = 0
+        v = self.v
+        v[x] ^= v[y]
+        v[0xF] = 0
 
-    def instr_add_vx_vy(self):
+    def instr_xor_vx_vy_keep_vf(self, x, y):
+        """
+        8xy3 without the VF reset quirk
+        """
+        self.v[x] ^= self.v[y]
+
+    def instr_add_vx_vy(self, x, y):
         """
         8xy4: Vx += Vy, set Vf = 1 on overflow or Vf = 0 otherwise
         """
-        x = (self.operand & 0x0F00) >> 8
-        y = (self.operand & 0x00F0) >> 4
-        self.v[x] += self.v[y]
+        v = self.v
+        result = v[x] + v[y]
 
         # handle overflow
-        if self.v[x] > 255:
-            self.v[x] -= 256
-            self.v[0xF] = 1
-        else:
-            self.v[0xF] = 0
+        v[x] = result & 0xFF
+        v[0xF] = result >> 8
 
-    def instr_sub_vx_vy(self):
+    def instr_sub_vx_vy(self, x, y):
         """
         8xy5: Vx -= Vy, set Vf = 1 if Vx > Vy or Vf = 0 otherwise
         """
-        x = (self.operand & 0x0F00) >> 8
-        y = (self.operand & 0x00F0) >> 4
-        self.v[x] -= self.v[y]
-        if self.v[x] < 0:
-            self.v[x] += 256
-            self.v[0xF] = 0
-        else:
-            self.v[0xF] = 1
+        v = self.v
+        result = v[x] - v[y]
+        v[x] = result & 0xFF
+        v[0xF] = 1 if result >= 0 else 0
 
-    def instr_shr_vx(self):
+    def instr_shr_vx(self, x, y):
         """
         8xy6: Vx = Vy, then right-shift Vx by 1
         Set Vf = 1 if least-significant bit of Vx was 1 or Vf = 0 otherwise.
         WARNING: This opcode is ambiguous! Many Chip-8 implementations ignore Vy.
         """
-        x = (self.operand & 0x0F00) >> 8
-        y = (self.operand & 0x00F0) >> 4
+        v = self.v
+        x_copy = v[y]
 
-        self.v[x] = self.v[y]
-        x_copy = self.v[x]
+        v[x] = x_copy >> 1
+        v[0xF] = x_copy & 0x1
+
+    def instr_shr_vx_in_place(self, x, y):
+        """
+        8xy6 with the shifting quirk: right-shift Vx itself, Vy is ignored
+        """
+        v = self.v
+        x_copy = v[x]
 
-        self.v[x] >>= 1
-        self.v[0xF] = x_copy & 0x1
+        v[x] = x_copy >> 1
+        v[0xF] = x_copy & 0x1
 
-    def instr_subn_vy(self):
+    def instr_subn_vy(self, x, y):
         """
         8xy7: Vx = Vy - Vx, set Vf = 1 if Vy > Vx of Vf = 0 otherwise
         """
-        x = (self.operand & 0x0F00) >> 8
-        y = (self.operand & 0x00F0) >> 4
-        self.v[x] = self.v[y] - self.v[x]
+        v = self.v
+        result = v[y] - v[x]
+        v[x] = result & 0xFF
+        v[0xF] = 1 if result >= 0 else 0
 
-        if self.v[x] < 0:
-            self.v[x] += 256
-            self.v[0xF] = 0
-        else:
-            self.v[0xF] = 1
-
-    def instr_shl_vx(self):
+    def instr_shl_vx(self, x, y):
         """
         8xyE: Vx = Vy, then left-shift Vx by 1
         Set Vf = 1 if most-significant bit of Vx was 1 or Vf = 0 otherwise.
         WARNING: This opcode is ambiguous! Many Chip-8 implementations ignore Vy.
         """
-        x = (self.operand & 0x0F00) >> 8
-        y = (self.operand & 0x00F0) >> 4
-        
-        self.v[x] = self.v[y]
-        x_copy = self.v[x]
-        
-        self.v[x] = (self.v[x] << 1) % 256
-        self.v[0xF] = (x_copy & 0x80) == 0x80
+        v = self.v
+        x_copy = v[y]
+
+        v[x] = (x_copy << 1) & 0xFF
+        v[0xF] = x_copy >> 7
+
+    def instr_shl_vx_in_place(self, x, y):
+        """
+        8xyE with the shifting quirk: left-shift Vx itself, Vy is ignored
+        """
+        v = self.v
+        x_copy = v[x]
+
+        v[x] = (x_copy << 1) & 0xFF
+        v[0xF] = x_copy >> 7
 
-    def instr_sne_vx_vy(self):
+    def instr_sne_vx_vy(self, x, y):
         """
         9xy0: Skip next instruction if Vx != Vy (increment pc by 2)
         """
-        x = (self.operand & 0x0F00) >> 8
-        y = (self.operand & 0x00F0) >> 4
         if self.v[x] != self.v[y]:
             self.pc += 2
 
-    def instr_ld_i_byte(self):
+    def instr_ld_i_byte(self, nnn):
         """
         Annn: I = nnn
         """
-        self.I = self.operand & 0x0FFF
+        self.I = nnn
 
-    def instr_jmp_offset(self):
+    def instr_jmp_offset(self, nnn):
         """
         Bnnn: Set program counter to nnn + v0
         """
-        self.pc = (self.operand & 0x0FFF) + self.v[0]
+        self.pc = nnn + self.v[0]
+
+    def instr_jmp_offset_vx(self, nnn):
+        """
+        Bxnn with the jumping quirk: Set program counter to xnn + Vx
+        """
+        self.pc = nnn + self.v[nnn >> 8]
 
-    def instr_vx_rnd(self):
+    def instr_vx_rnd(self, x, nn):
         """
         Cxnn: Set Vx to a random byte AND nn
         """
-        x = (self.operand & 0x0F00) >> 8
-        rand = randint(0, 255)
-        self.v[x] = rand & (self.operand & 0x00FF)
+        rand = self.random.randint(0, 255)
+        self.v[x] = rand & nn
 
-    def instr_drw(self):
+    def instr_drw(self, x, y, z):
         """
         Dxyz: Display z-byte sprite starting from I at (Vx, Vy).
         Set Vf = 1 if a already drawn pixel gets overwritten (XOR).
         """
-        x = (self.operand & 0x0F00) >> 8
-        y = (self.operand & 0x00F0) >> 4
-        z = self.operand & 0x000F
+        display = self.display
+        x_pos = self.v[x] % display.width
+        y_pos = self.v[y] % display.height
 
-        x_pos = self.v[x] % 64
-        y_pos = self.v[y] % 32
+        # every sprite row is XORed onto the screen row as a whole
+        sprite = self.memory[self.I:self.I + z]
+        self.v[0xF] = 1 if display.draw_sprite(x_pos, y_pos, sprite) else 0
 
-        if self.debug:
-            print(f"Printing sprite at ({(x_pos, y_pos)})")
+        display.update()  # update screen
 
-        self.v[0xF] = 0  # reset Vf
-        for row in range(z):
-            # get byte to display at current row
-            sprite_row = self.memory[self.I + row]
+    def instr_drw_wrap(self, x, y, z):
+        """
+        Dxyz without the clipping quirk: sprites wrap around the screen edges
+        """
+        display = self.display
+        x_pos = self.v[x] % display.width
+        y_pos = self.v[y] % display.height
 
-            # split into individual pixels (note: string manipulation might be faster)
-            pixels = [
-                (sprite_row & 0x80) >> 7,
-                (sprite_row & 0x40) >> 6,
-                (sprite_row & 0x20) >> 5,
-                (sprite_row & 0x10) >> 4,
-                (sprite_row & 0x8) >> 3,
-                (sprite_row & 0x4) >> 2,
-                (sprite_row & 0x2) >> 1,
-                (sprite_row & 0x1),
-            ]
+        sprite = self.memory[self.I:self.I + z]
+        self.v[0xF] = 1 if display.draw_sprite_wrapped(x_pos, y_pos, sprite) else 0
 
-            if self.debug:
-                print(f"Trying to print sprite from ({hex(self.I + row)}): {pixels}")
+        display.update()
 
-            for index, pixel in enumerate(pixels):
-                if pixel == 1:
-                    x_coord = x_pos + index
-                    y_coord = y_pos + row
-                    if x_coord >= 64 or y_coord >= 32:
-                        break
-                    if self.display.flip_pixel(x_coord, y_coord):
-                        self.v[0xF] = 1
+    def instr_drw_large(self, x, y):
+        """
+        Dxy0: Display the 16x16 sprite (32 bytes, two per row) starting from I at (Vx, Vy).
+        Set Vf = 1 if a already drawn pixel gets overwritten (XOR).
+        """
+        display = self.display
+        x_pos = self.v[x] % display.width
+        y_pos = self.v[y] % display.height
+
+        sprite = self.memory[self.I:self.I + 32]
+        self.v[0xF] = 1 if display.draw_large_sprite(x_pos, y_pos, sprite) else 0
+
+        display.update()
+
+    def instr_drw_large_wrap(self, x, y):
+        """
+        Dxy0 without the clipping quirk: sprites wrap around the screen edges
+        """
+        display = self.display
+        x_pos = self.v[x] % display.width
+        y_pos = self.v[y] % display.height
+
+        sprite = self.memory[self.I:self.I + 32]
+        self.v[0xF] = 1 if display.draw_large_sprite_wrapped(x_pos, y_pos, sprite) else 0
 
-        self.display.update()  # update screen
+        display.update()
 
-    def instr_skp(self):
+    def instr_skp(self, x):
         """
         Ex9E: Skip next instruction if key with value of Vx is pressed
         """
-        x = (self.operand & 0x0F00) >> 8
-        if KEY_MAPPINGS[self.v[x]] in self.pressed_keys:
-            if self.debug:
-                print(f"Keypress handled: {KEY_MAPPINGS[self.v[x]]}")
+        if (self.keypad >> self.v[x]) & 1:
             self.pc += 2
 
-    def instr_sknp(self):
+    def instr_sknp(self, x):
         """
         ExA1: Skip next instruction if key with value of Vx is not pressed
         """
-        x = (self.operand & 0x0F00) >> 8
-
-        if KEY_MAPPINGS[self.v[x]] not in self.pressed_keys:
+        if not (self.keypad >> self.v[x]) & 1:
             self.pc += 2
 
-    def instr_ld_vx_dt(self):
+    def instr_ld_vx_dt(self, x):
         """
         Fx07: Vx = delay timer
         """
-        x = (self.operand & 0x0F00) >> 8
-        self.v[x] = self.timers["delay"]
-
-    def instr_ld_vx_k(self):
-        """
-        Fx0A: Stop execution until any key is pressed, then store value of key in Vx.
-        If several keys are pressed this will respect the first key from the KEY_MAPPINGS constant.
-        Note: Timers should continue to descent.
-        """
-        x = (self.operand & 0x0F00) >> 8
-        print('Waiting for keypress...')
-        pressed = None
-        while True:
-            self.handle_events(pygame.event.get())
-            if pressed == None:
-                for key_value, key_mapping in KEY_MAPPINGS.items():
-                    if key_mapping in self.pressed_keys:
-                        self.v[x] = key_value 
-                        print(f"Key {key_mapping} pressed")
-                        pressed = key_mapping
-            else:
-                if pressed not in self.pressed_keys:
-                    print(f"Key {pressed} released")
-                    return 
-
-    def instr_ld_dt_vx(self):
+        self.v[x] = self.get_timer("delay")
+
+    def instr_ld_vx_k(self, x):
+        """
+        Fx0A: Stop execution until any key is pressed and released, then store value of key in Vx.
+        If several keys are pressed this will respect the first key from the KEY_ORDER constant.
+        The instruction repeats itself while waiting, so timers continue to descent.
+        Keys only change between frames, so the rest of the frame is skipped while waiting.
+        """
+        if self.key_wait is None:
+            if self.keypad:
+                for key in KEY_ORDER:
+                    if (self.keypad >> key) & 1:
+                        self.key_wait = key
+                        break
+            self.pc -= 2
+            raise IdleLoopException(1)
+        elif (self.keypad >> self.key_wait) & 1:
+            self.pc -= 2
+            raise IdleLoopException(1)
+        else:
+            self.v[x] = self.key_wait
+            self.key_wait = None
+
+    def instr_ld_dt_vx(self, x):
         """
         Fx15: Delay timer = Vx
         """
-        x = (self.operand & 0x0F00) >> 8
-        self.timers["delay"] = self.v[x]
+        self.set_timer("delay", self.v[x])
 
-    # Fx18: Sound timer = Vx
-    def instr_ld_vx_st(self):
-        x = (self.operand & 0x0F00) >> 8
-        self.timers["delay"] = self.v[x]
+    def instr_ld_st_vx(self, x):
+        """
+        Fx18: Sound timer = Vx
+        """
+        self.set_timer("sound", self.v[x])
 
-    def instr_add_i_vx(self):
+    def instr_add_i_vx(self, x):
         """
         Fx1E: I = I + Vx
         """
-        x = (self.operand & 0x0F00) >> 8
         self.I += self.v[x]  # @todo: overflow?
 
-    def instr_ld_i_vx(self):
+    def instr_ld_i_vx(self, x):
         """
         Fx29: I = Location of sprite for digit Vx
         """
-        x = (self.operand & 0x0F00) >> 8
         self.I = self.v[x] * 10
 
-    def instr_ld_bcd_vx_i(self):
+    def instr_ld_i_big_vx(self, x):
         """
-        Fx33: Take decimal number in format 'abc' from Vx and store a at I, b at I+1 and c at I+2
+        Fx30: I = Location of the big (8x10) sprite for digit Vx
         """
-        x = (self.operand & 0x0F00) >> 8
+        self.I = BIG_FONT_ADDRESS + (self.v[x] & 0xF) * 10
 
-        a = floor(self.v[x] / 100)
-        b = self.v[x] % 100
-        b = floor(b / 10)
-        c = self.v[x] % 10
+    def instr_ld_bcd_vx_i(self, x):
+        """
+        Fx33: Take decimal number in format 'abc' from Vx and store a at I, b at I+1 and c at I+2
+        """
+        value = self.v[x]
 
-        self.memory[self.I] = int(a)  # are int checks required?
-        self.memory[self.I + 1] = int(b)
-        self.memory[self.I + 2] = int(c)
+        self.memory[self.I] = value // 100
+        self.memory[self.I + 1] = (value % 100) // 10
+        self.memory[self.I + 2] = value % 10
 
-    def instr_store_v0_vx(self):
+    def instr_store_v0_vx(self, x):
         """
         Fx55: Store v0 to Vx in memory starting at address in I
-        Quirk: I gets incremented on every store 
+        Quirk: I gets incremented on every store
+        """
+        memory, v, I = self.memory, self.v, self.I
+        for i in range(x + 1):
+            memory[I + i] = v[i]
+        self.I = I + x + 1
+
+    def instr_store_v0_vx_chip48(self, x):
+        """
+        Fx55 as on CHIP-48: I ends up incremented by x only
         """
-        x = (self.operand & 0x0F00) >> 8
+        memory, v, I = self.memory, self.v, self.I
+        for i in range(x + 1):
+            memory[I + i] = v[i]
+        self.I = I + x
 
+    def instr_store_v0_vx_keep_i(self, x):
+        """
+        Fx55 as on SUPER-CHIP: I is left unchanged
+        """
+        memory, v, I = self.memory, self.v, self.I
         for i in range(x + 1):
-            self.memory[self.I] = self.v[i]
-            self.I += 1
+            memory[I + i] = v[i]
 
-    def instr_read_v0_vx(self):
+    def instr_read_v0_vx(self, x):
         """
         Fx65: Read v0 to Vx from memory starting at address in I
         Quirk: I gets incremented on every read
         """
-        x = (self.operand & 0x0F00) >> 8
+        memory, v, I = self.memory, self.v, self.I
+        for i in range(x + 1):
+            v[i] = memory[I + i]
+        self.I = I + x + 1
+
+    def instr_read_v0_vx_chip48(self, x):
+        """
+        Fx65 as on CHIP-48: I ends up incremented by x only
+        """
+        memory, v, I = self.memory, self.v, self.I
+        for i in range(x + 1):
+            v[i] = memory[I + i]
+        self.I = I + x
+
+    def instr_read_v0_vx_keep_i(self, x):
+        """
+        Fx65 as on SUPER-CHIP: I is left unchanged
+        """
+        memory, v, I = self.memory, self.v, self.I
+        for i in range(x + 1):
+            v[i] = memory[I + i]
+
+    def instr_store_rpl(self, x):
+        """
+        Fx75: Store v0 to Vx in the RPL user flags
+        """
+        rpl, v = self.rpl, self.v
+        for i in range(x + 1):
+            rpl[i] = v[i]
 
+    def instr_read_rpl(self, x):
+        """
+        Fx85: Read v0 to Vx from the RPL user flags
+        """
+        rpl, v = self.rpl, self.v
         for i in range(x + 1):
-            self.v[i] = self.memory[self.I]
-            self.I += 1
+            v[i] = rpl[i]
+
+    ######################
+    ### Debug handlers ###
+    ######################
+
+    def debug_instr_ret(self):
+        print("Stack before pop:")
+        print(self.stack)
+        self.instr_ret()
+        print("Stack after pop:")
+        print(self.stack)
+
+    def debug_instr_drw(self, x, y, z):
+        x_pos = self.v[x] % self.display.width
+        y_pos = self.v[y] % self.display.height
+        print(f"Printing sprite at ({(x_pos, y_pos)})")
+        for row in range(z):
+            sprite_row = self.memory[self.I + row]
+            print(f"Trying to print sprite from ({hex(self.I + row)}): {format(sprite_row, '08b')}")
+        self.instr_drw(x, y, z)
 
+    def debug_instr_skp(self, x):
+        if (self.keypad >> self.v[x]) & 1:
+            print(f"Keypress handled: {hex(self.v[x])}")
+        self.instr_skp(x)
@@ -1,2 +1,14 @@
 class OpcodeNotImplementedException(Exception):
     pass
+
+
+class IdleLoopException(Exception):
+    """
+    Raised by an instruction which found the program idling in a loop of the given length.
+    Until the end of the frame every pass through the loop leaves the machine unchanged,
+    so the instructions left in the frame can be skipped in whole passes.
+    """
+
+    def __init__(self, length: int):
+        super().__init__(length)
+        self.length = length
@@ -1,44 +1,114 @@
-import pygame
-import sys
-
-COLOR_OFF = (0xff, 0xf6, 0xd3)
-COLOR_ON  = (0x7c, 0x3f, 0x58)
-SCALE = 10
-
-
-class Chip8Display(object):
-    def __init__(self):
-        # 64 * 32 screen
-        self.width = 64
-        self.height = 32
-
-        pygame.init()
-
-        self.screen = pygame.display.set_mode((self.width * SCALE, self.height * SCALE))
-        self.screen.fill(COLOR_ON)
-
-        pygame.display.set_caption("CHIP8")
-
-    def flip_pixel(self, x, y) -> bool:
-        """
-        Flip the pixel at coordinate (x,y)
-
-        :returns:
-            0 if pixel was not set before, 1 if pixel was set
-        """
-        curr_pixel = self.screen.get_at((x * SCALE, y * SCALE))
-
-        if curr_pixel == COLOR_OFF:
-            new_color = COLOR_ON
-            res = False
-        else:
-            new_color = COLOR_OFF
-            res = True
-        pygame.draw.rect(self.screen, new_color, (x * SCALE, y * SCALE, SCALE, SCALE))
-        return res
-
-    def clear(self):
-        self.screen.fill(COLOR_OFF)
-
-    def update(self):
-        pygame.display.flip()
+from chip8.framebuffer import Chip8Framebuffer, WIDTH, HEIGHT
+import pygame
+
+COLOR_OFF = (0xff, 0xf6, 0xd3)
+COLOR_ON  = (0x7c, 0x3f, 0x58)
+SCALE = 10
+
+# (off, on) color pairs to choose from at runtime
+PALETTES = {
+    "default": (COLOR_OFF, COLOR_ON),
+    "mono": ((0x00, 0x00, 0x00), (0xff, 0xff, 0xff)),
+    "green": ((0x0f, 0x1f, 0x0f), (0x33, 0xff, 0x66)),
+    "amber": ((0x1f, 0x12, 0x00), (0xff, 0xb0, 0x00)),
+}
+
+# a byte of pixels as eight palette indices
+PIXEL_BYTES = [bytes((byte >> (7 - bit)) & 1 for bit in range(8)) for byte in range(256)]
+
+
+class Chip8Display(Chip8Framebuffer):
+    """
+    Framebuffer presented in a pygame window.
+    Pixels are read and written in memory, the window only gets redrawn on present().
+    Changed rows are copied into a 1:1 palette surface, and the band of changed rows is scaled to the window in one go,
+    so presenting costs the same however many pixels changed. Only changed rows are pushed to the screen.
+    The window keeps its size in SUPER-CHIP hi-res mode, its pixels are scaled by half.
+    """
+
+    def __init__(self, present_on_draw: bool = False, scale: int = SCALE, palette=PALETTES["default"]):
+        super().__init__()
+
+        # present after every single draw instead of once per frame (useful for debugging)
+        self.present_on_draw = present_on_draw
+
+        pygame.init()
+
+        # one byte per pixel, 0 = off, 1 = on
+        self.pixels = pygame.Surface((self.width, self.height), depth=8)
+        # the same in colors, in the window's pixel format so it can be scaled straight onto the window
+        self.colors = None
+        self.scale = None
+        self.palette = palette
+        self.set_scale(scale)
+        self.set_palette(*palette)
+
+        pygame.display.set_caption("CHIP8")
+
+    def set_scale(self, scale: int):
+        """
+        Resize the window to scale window pixels per low-res CHIP-8 pixel
+        """
+        self.scale = max(1, scale)
+        self.screen = pygame.display.set_mode((WIDTH * self.scale, HEIGHT * self.scale))
+        self.colors = self.pixels.convert()
+        self.dirty = (1 << self.height) - 1
+
+    def set_resolution(self, width: int, height: int):
+        super().set_resolution(width, height)
+        self.pixels = pygame.Surface((width, height), depth=8)
+        self.set_palette(*self.palette)
+        self.colors = self.pixels.convert()
+
+    def set_palette(self, off, on):
+        """
+        Change the colors of unset and set pixels
+        """
+        self.palette = (off, on)
+        self.pixels.set_palette_at(0, off)
+        self.pixels.set_palette_at(1, on)
+        self.dirty = (1 << self.height) - 1
+
+    def update(self):
+        if self.present_on_draw:
+            self.present()
+
+    def present(self):
+        """
+        Copy changed rows into the pixel surface, scale them to the window and push them to the screen
+        """
+        if not self.dirty:
+            return
+
+        # window rows covering CHIP-8 rows start to end
+        window_width, window_height = self.screen.get_size()
+
+        def window_rows(start: int, end: int) -> pygame.Rect:
+            top = start * window_height // self.height
+            return pygame.Rect(0, top, window_width, end * window_height // self.height - top)
+
+        pitch = self.pixels.get_pitch()
+        padding = bytes(pitch - self.width)
+        row_bytes = self.width // 8
+        buffer = self.pixels.get_buffer()
+        rects = []
+        first = None
+        for start, end in self.dirty_ranges():
+            data = b"".join(
+                b"".join(PIXEL_BYTES[byte] for byte in self.rows[y].to_bytes(row_bytes, "big")) + padding
+                for y in range(start, end)
+            )
+            buffer.write(data, start * pitch)
+            rects.append(window_rows(start, end))
+            if first is None:
+                first = start
+        # unlock the surface again
+        del buffer
+        self.dirty = 0
+
+        # one scale from the first to the last changed row
+        band = pygame.Rect(0, first, self.width, end - first)
+        self.colors.blit(self.pixels, band, band)
+        target = window_rows(first, end)
+        pygame.transform.scale(self.colors.subsurface(band), target.size, self.screen.subsurface(target))
+        pygame.display.update(rects)
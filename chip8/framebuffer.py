@@ -0,0 +1,244 @@
+WIDTH = 64
+HEIGHT = 32
+# SUPER-CHIP hi-res mode
+HIRES_WIDTH = 128
+HIRES_HEIGHT = 64
+
+# lookup tables turning a sprite byte into a row mask, by screen width, wrapping and x position
+SPRITE_MASKS = {}
+
+
+def sprite_masks(width: int, wrap: bool = False) -> list:
+    """
+    Build (or get cached) row masks for every x position and sprite byte.
+    Pixels beyond the right edge are clipped, or wrapped around to the left edge.
+    """
+    if (width, wrap) not in SPRITE_MASKS:
+        full = (1 << width) - 1
+        SPRITE_MASKS[width, wrap] = [
+            [
+                byte << (width - 8 - x) if x <= width - 8
+                else byte >> (x - width + 8) | ((byte << (2 * width - 8 - x)) & full if wrap else 0)
+                for byte in range(256)
+            ]
+            for x in range(width)
+        ]
+    return SPRITE_MASKS[width, wrap]
+
+
+class Chip8Framebuffer(object):
+    """
+    In-memory framebuffer without any window attached.
+    Every row is stored as an integer, the leftmost pixel being the most significant bit.
+    Changed rows are tracked as a bitmask (bit n = row n) until the next present().
+    """
+
+    def __init__(self):
+        # 64 * 32 screen, 128 * 64 in SUPER-CHIP hi-res mode
+        self.width = WIDTH
+        self.height = HEIGHT
+
+        self.rows = [0] * self.height
+        self.dirty = 0
+
+        self.sprite_masks = sprite_masks(self.width)
+        self.wrapped_masks = sprite_masks(self.width, True)
+
+    def set_resolution(self, width: int, height: int):
+        """
+        Switch to another screen size (SUPER-CHIP 00FE/00FF), the screen gets cleared
+        """
+        self.width = width
+        self.height = height
+        self.sprite_masks = sprite_masks(width)
+        self.wrapped_masks = sprite_masks(width, True)
+        self.rows = [0] * height
+        self.dirty = (1 << height) - 1
+
+    def get_pixel(self, x, y) -> bool:
+        """
+        Read the pixel at coordinate (x,y)
+        """
+        return (self.rows[y] >> (self.width - 1 - x)) & 1 == 1
+
+    def flip_pixel(self, x, y) -> bool:
+        """
+        Flip the pixel at coordinate (x,y)
+
+        :returns:
+            0 if pixel was not set before, 1 if pixel was set
+        """
+        bit = 1 << (self.width - 1 - x)
+        row = self.rows[y]
+        self.rows[y] = row ^ bit
+        self.dirty |= 1 << y
+        return row & bit != 0
+
+    def draw_sprite(self, x, y, sprite) -> bool:
+        """
+        XOR sprite bytes onto the screen, one row per byte, starting at (x,y).
+        Pixels beyond the right and bottom edges are clipped.
+
+        :returns:
+            True if any set pixel got unset (collision)
+        """
+        masks = self.sprite_masks[x]
+        rows = self.rows
+        height = min(len(sprite), self.height - y)
+        collision = 0
+        for row in range(height):
+            mask = masks[sprite[row]]
+            old = rows[y + row]
+            collision |= old & mask
+            rows[y + row] = old ^ mask
+        if height > 0:
+            self.dirty |= ((1 << height) - 1) << y
+        return collision != 0
+
+    def draw_large_sprite(self, x, y, sprite) -> bool:
+        """
+        Like draw_sprite(), for a SUPER-CHIP 16x16 sprite: 32 bytes, two per row.
+        Each half of a row is masked like an 8 pixel sprite, the right half is clipped completely near the edge.
+        """
+        left = self.sprite_masks[x]
+        right = self.sprite_masks[x + 8] if x + 8 < self.width else None
+        rows = self.rows
+        height = min(len(sprite) // 2, self.height - y)
+        collision = 0
+        for row in range(height):
+            mask = left[sprite[2 * row]]
+            if right is not None:
+                mask |= right[sprite[2 * row + 1]]
+            old = rows[y + row]
+            collision |= old & mask
+            rows[y + row] = old ^ mask
+        if height > 0:
+            self.dirty |= ((1 << height) - 1) << y
+        return collision != 0
+
+    def draw_sprite_wrapped(self, x, y, sprite) -> bool:
+        """
+        Like draw_sprite(), but pixels beyond the right and bottom edges wrap around to the other side
+        """
+        masks = self.wrapped_masks[x]
+        rows = self.rows
+        height = self.height
+        collision = 0
+        for row in range(len(sprite)):
+            y_pos = (y + row) % height
+            mask = masks[sprite[row]]
+            old = rows[y_pos]
+            collision |= old & mask
+            rows[y_pos] = old ^ mask
+            self.dirty |= 1 << y_pos
+        return collision != 0
+
+    def draw_large_sprite_wrapped(self, x, y, sprite) -> bool:
+        """
+        Like draw_large_sprite(), but pixels beyond the right and bottom edges wrap around to the other side
+        """
+        left = self.wrapped_masks[x]
+        right = self.wrapped_masks[(x + 8) % self.width]
+        rows = self.rows
+        height = self.height
+        collision = 0
+        for row in range(len(sprite) // 2):
+            y_pos = (y + row) % height
+            mask = left[sprite[2 * row]] | right[sprite[2 * row + 1]]
+            old = rows[y_pos]
+            collision |= old & mask
+            rows[y_pos] = old ^ mask
+            self.dirty |= 1 << y_pos
+        return collision != 0
+
+    def scroll_down(self, n: int):
+        """
+        Move the whole screen down by n rows, blank rows come in at the top
+        """
+        n = min(n, self.height)
+        self.rows[:] = [0] * n + self.rows[:self.height - n]
+        self.dirty = (1 << self.height) - 1
+
+    def scroll_right(self, n: int):
+        """
+        Move the whole screen right by n pixels, pixels pushed over the edge are lost
+        """
+        self.rows[:] = [row >> n for row in self.rows]
+        self.dirty = (1 << self.height) - 1
+
+    def scroll_left(self, n: int):
+        """
+        Move the whole screen left by n pixels, pixels pushed over the edge are lost
+        """
+        full = (1 << self.width) - 1
+        self.rows[:] = [(row << n) & full for row in self.rows]
+        self.dirty = (1 << self.height) - 1
+
+    def clear(self):
+        self.rows[:] = [0] * self.height
+        self.dirty = (1 << self.height) - 1
+
+    def update(self):
+        """
+        Called after every draw. Presenting is left to present(), once per frame.
+        """
+        pass
+
+    def present(self):
+        """
+        Show all changes since the last call. Nothing to show without a window.
+        """
+        self.dirty = 0
+
+    def dirty_ranges(self):
+        """
+        Yield (first, last + 1) for every run of consecutive changed rows
+        """
+        dirty = self.dirty
+        y = 0
+        while dirty:
+            # skip unchanged rows
+            while not dirty & 1:
+                dirty >>= 1
+                y += 1
+            start = y
+            while dirty & 1:
+                dirty >>= 1
+                y += 1
+            yield start, y
+
+    def to_bytes(self) -> bytes:
+        """
+        Pack the framebuffer into bytes, row by row (64 * 32 pixels -> 256 bytes, 128 * 64 -> 1024)
+        """
+        row_bytes = self.width // 8
+        return b"".join(row.to_bytes(row_bytes, "big") for row in self.rows)
+
+    def load_bytes(self, data: bytes):
+        """
+        Restore the framebuffer from bytes created by to_bytes() at the current resolution
+        """
+        row_bytes = self.width // 8
+        self.rows[:] = [
+            int.from_bytes(data[y * row_bytes:(y + 1) * row_bytes], "big")
+            for y in range(self.height)
+        ]
+        self.dirty = (1 << self.height) - 1
+
+    def load_rows(self, rows, width: int):
+        """
+        Show rows taken from another framebuffer of the given width, only rows that differ are marked as changed.
+        The resolution follows the other framebuffer.
+        """
+        if (width, len(rows)) != (self.width, self.height):
+            self.set_resolution(width, len(rows))
+        for y, row in enumerate(rows):
+            if self.rows[y] != row:
+                self.rows[y] = row
+                self.dirty |= 1 << y
+
+    def __str__(self):
+        return "\n".join(
+            format(row, f"0{self.width}b").replace("0", ".").replace("1", "#")
+            for row in self.rows
+        )
@@ -0,0 +1,48 @@
+from chip8.cpu import Chip8CPU
+import pygame
+
+KEY_MAPPINGS = {
+    0x1: pygame.K_1,
+    0x2: pygame.K_2,
+    0x3: pygame.K_3,
+    0xC: pygame.K_4,
+    0x4: pygame.K_q,
+    0x5: pygame.K_w,
+    0x6: pygame.K_e,
+    0xD: pygame.K_r,
+    0x7: pygame.K_a,
+    0x8: pygame.K_s,
+    0x9: pygame.K_d,
+    0xE: pygame.K_f,
+    0xA: pygame.K_y,
+    0x0: pygame.K_x,
+    0xB: pygame.K_c,
+    0xF: pygame.K_v,
+}
+
+KEY_MAPPINGS_INVERSE = {v: k for k, v in KEY_MAPPINGS.items()}
+
+
+class PygameInput(object):
+    """
+    Feeds pygame keyboard events into the keypad of a CPU.
+    Other keys stay available to the frontend as pressed_keys (pygame key codes).
+    """
+
+    def __init__(self, cpu: Chip8CPU):
+        self.cpu = cpu
+        self.pressed_keys = set()
+
+    def handle_events(self, events):
+        for event in events:
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                exit()
+            elif event.type == pygame.KEYDOWN:
+                self.pressed_keys.add(event.key)
+                if event.key in KEY_MAPPINGS_INVERSE:
+                    self.cpu.press_key(KEY_MAPPINGS_INVERSE[event.key])
+            elif event.type == pygame.KEYUP:
+                self.pressed_keys.discard(event.key)
+                if event.key in KEY_MAPPINGS_INVERSE:
+                    self.cpu.release_key(KEY_MAPPINGS_INVERSE[event.key])
@@ -0,0 +1,82 @@
+from time import perf_counter, sleep
+
+# CHIP-8 timers run at 60 Hz, so does the virtual clock
+FRAME_RATE = 60
+
+# give up catching up when falling behind by more than this (seconds)
+MAX_LAG = 0.25
+
+
+class FramePacer(object):
+    """
+    Optional real-time layer on top of the virtual clock.
+    Sleeps after every frame so frames pass at speed * 60 Hz of wall-clock time.
+    A speed of 0 runs unthrottled.
+    """
+
+    def __init__(self, speed: float = 1.0):
+        self.speed = speed
+        self.next_frame = perf_counter()
+
+    def set_speed(self, speed: float):
+        """
+        Change the speed, counting from now on
+        """
+        self.speed = speed
+        self.next_frame = perf_counter()
+
+    def delay(self) -> float:
+        """
+        Count a frame and return the seconds until the next one is due, for loops that sleep on their own (asyncio)
+        """
+        if not self.speed:
+            return 0
+
+        now = perf_counter()
+        self.next_frame += 1 / (FRAME_RATE * self.speed)
+        if self.next_frame > now:
+            return self.next_frame - now
+        if now - self.next_frame > MAX_LAG:
+            # host is too slow, drop the missed frames instead of rushing through them
+            self.next_frame = now
+        return 0
+
+    def wait(self):
+        """
+        Wait until the next frame is due
+        """
+        delay = self.delay()
+        if delay:
+            sleep(delay)
+
+
+class FrameSkipper(object):
+    """
+    Decides which frames get presented while running faster than real time.
+    At most refresh_rate frames per second of wall-clock time are presented and all others skipped,
+    so the number of skipped frames adapts to however fast emulation runs.
+    """
+
+    def __init__(self, refresh_rate: float = FRAME_RATE):
+        self.interval = 1 / refresh_rate
+        self.last_present = perf_counter()
+
+        # frames since the last presented one
+        self.frames = 0
+        # emulation speed relative to real time, measured between presented frames
+        self.speed = 1.0
+
+    def due(self) -> bool:
+        """
+        Count a frame and tell whether it should be presented
+        """
+        self.frames += 1
+        now = perf_counter()
+        elapsed = now - self.last_present
+        if elapsed < self.interval:
+            return False
+
+        self.speed = self.frames / (elapsed * FRAME_RATE)
+        self.frames = 0
+        self.last_present = now
+        return True
@@ -0,0 +1,142 @@
+from chip8.cpu import Chip8CPU
+from functools import partial
+from time import perf_counter_ns
+
+
+class Profiler(object):
+    """
+    Counts executed instructions per handler and per PC, and the time spent in every handler.
+    Enabling swaps the CPU's decode cache for one holding timed wrappers around the regular handlers,
+    so the regular dispatch is left untouched and costs nothing extra while profiling is off.
+    """
+
+    def __init__(self, cpu: Chip8CPU):
+        self.cpu = cpu
+
+        # handler name -> [calls, nanoseconds]
+        self.handlers = {}
+        # address -> instructions executed there
+        self.pcs = {}
+        # address -> 2nnn calls to it
+        self.calls = {}
+
+        # opcode -> profiled handler, kept across enable() / disable()
+        self.op_cache = {}
+        # regular decode cache of the CPU while profiling
+        self.saved_cache = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.saved_cache is not None
+
+    def enable(self):
+        cpu = self.cpu
+        if self.enabled:
+            return
+        self.saved_cache = cpu.op_cache
+        cpu.op_cache = self.op_cache
+        cpu.decode = self.decode
+        if type(cpu).execute is not Chip8CPU.execute:
+            # compiled blocks bypass the decode cache, run them through the interpreter instead
+            cpu.execute = partial(Chip8CPU.execute, cpu)
+
+    def disable(self):
+        cpu = self.cpu
+        if not self.enabled:
+            return
+        cpu.op_cache = self.saved_cache
+        self.saved_cache = None
+        # drop the instance attributes, the class methods show through again
+        del cpu.decode
+        cpu.__dict__.pop("execute", None)
+
+    def reset(self):
+        self.handlers.clear()
+        self.pcs.clear()
+        self.calls.clear()
+
+    def decode(self, opcode: int):
+        """
+        Decode like the CPU does and wrap the handler with counters and a timer
+        """
+        instr = type(self.cpu).decode(self.cpu, opcode)
+        name = getattr(instr, "func", instr).__name__
+        stats = self.handlers.setdefault(name, [0, 0])
+        pcs = self.pcs
+        cpu = self.cpu
+        clock = perf_counter_ns
+
+        if opcode >> 12 == 0x2:
+            calls = self.calls
+            target = opcode & 0x0FFF
+
+            def profiled():
+                pc = cpu.pc - 2
+                pcs[pc] = pcs.get(pc, 0) + 1
+                calls[target] = calls.get(target, 0) + 1
+                stats[0] += 1
+                start = clock()
+                instr()
+                stats[1] += clock() - start
+        else:
+            def profiled():
+                pc = cpu.pc - 2
+                pcs[pc] = pcs.get(pc, 0) + 1
+                stats[0] += 1
+                start = clock()
+                instr()
+                stats[1] += clock() - start
+
+        return profiled
+
+    def report(self, limit: int = 20) -> dict:
+        """
+        Collected numbers, sorted from hottest to coldest, ready to be dumped as JSON
+        """
+        total = sum(calls for calls, _ in self.handlers.values())
+        total_ns = sum(ns for _, ns in self.handlers.values())
+        memory = self.cpu.memory
+        return {
+            "instructions": total,
+            "nanoseconds": total_ns,
+            "handlers": [
+                {
+                    "handler": name,
+                    "calls": calls,
+                    "nanoseconds": ns,
+                    "ns_per_call": ns / calls if calls else 0,
+                    "time_share": ns / total_ns if total_ns else 0,
+                }
+                for name, (calls, ns) in sorted(self.handlers.items(), key=lambda item: -item[1][1])
+            ],
+            "pcs": [
+                {"pc": pc, "opcode": (memory[pc] << 8) | memory[pc + 1], "count": count}
+                for pc, count in sorted(self.pcs.items(), key=lambda item: -item[1])[:limit]
+            ],
+            "calls": [
+                {"target": target, "count": count}
+                for target, count in sorted(self.calls.items(), key=lambda item: -item[1])[:limit]
+            ],
+        }
+
+    def table(self, limit: int = 20) -> str:
+        """
+        Human readable version of report()
+        """
+        report = self.report(limit)
+        lines = [f"{'handler':<20} {'calls':>12} {'total ms':>10} {'ns/call':>9} {'time':>6}"]
+        for row in report["handlers"]:
+            lines.append(
+                f"{row['handler']:<20} {row['calls']:>12,} {row['nanoseconds'] / 1e6:>10.1f} "
+                f"{row['ns_per_call']:>9.0f} {row['time_share'] * 100:>5.1f}%"
+            )
+        lines.append("")
+        lines.append(f"{'pc':<8} {'opcode':<8} {'count':>12}")
+        for row in report["pcs"]:
+            lines.append(f"{row['pc']:#06x}   {row['opcode']:04X}     {row['count']:>12,}")
+        if report["calls"]:
+            lines.append("")
+            lines.append(f"{'call to':<8} {'count':>12}")
+            for row in report["calls"]:
+                lines.append(f"{row['target']:#06x}   {row['count']:>12,}")
+        return "\n".join(lines)
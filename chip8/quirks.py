@@ -0,0 +1,49 @@
+# CHIP-8 variants disagree on a few instructions. A profile picks one behaviour for each of them:
+#   vf_reset: 8xy1, 8xy2 and 8xy3 set VF to 0
+#   memory:   how Fx55 and Fx65 leave I: "increment" by x + 1, "chip48" by x, or "keep" it unchanged
+#   shifting: 8xy6 and 8xyE shift Vx in place, instead of shifting Vy into Vx
+#   jumping:  Bxnn jumps to xnn + Vx, instead of Bnnn jumping to nnn + V0
+#   clipping: sprites are cut off at the screen edges, instead of wrapping around
+#   extended: the SUPER-CHIP instructions exist (hi-res mode, 16x16 sprites, scrolling, big font, RPL flags, exit)
+PROFILES = {
+    "chip8": {"vf_reset": True, "memory": "increment", "shifting": False, "jumping": False, "clipping": True,
+              "extended": False},
+    "chip48": {"vf_reset": False, "memory": "chip48", "shifting": True, "jumping": True, "clipping": True,
+               "extended": False},
+    "superchip": {"vf_reset": False, "memory": "keep", "shifting": True, "jumping": True, "clipping": True,
+                  "extended": True},
+    "xochip": {"vf_reset": False, "memory": "increment", "shifting": False, "jumping": False, "clipping": False,
+               "extended": True},
+}
+
+DEFAULT_PROFILE = "chip8"
+
+MEMORY_SUFFIXES = {"increment": "", "chip48": "_chip48", "keep": "_keep_i"}
+
+
+def get_profile(name: str) -> dict:
+    if name not in PROFILES:
+        raise Exception(f"Unknown quirk profile {name}, choose from {', '.join(PROFILES)}")
+    return PROFILES[name]
+
+
+def handler_table(quirks: dict) -> dict:
+    """
+    Handler method to use for every instruction which depends on a quirk: instruction handler name -> method name.
+    A CPU binds these once when it is built, so the handlers themselves never check a quirk.
+    """
+    logic = "" if quirks["vf_reset"] else "_keep_vf"
+    shift = "_in_place" if quirks["shifting"] else ""
+    memory = MEMORY_SUFFIXES[quirks["memory"]]
+    return {
+        "instr_or_vx_vy": "instr_or_vx_vy" + logic,
+        "instr_and_vx_vy": "instr_and_vx_vy" + logic,
+        "instr_xor_vx_vy": "instr_xor_vx_vy" + logic,
+        "instr_shr_vx": "instr_shr_vx" + shift,
+        "instr_shl_vx": "instr_shl_vx" + shift,
+        "instr_jmp_offset": "instr_jmp_offset_vx" if quirks["jumping"] else "instr_jmp_offset",
+        "instr_store_v0_vx": "instr_store_v0_vx" + memory,
+        "instr_read_v0_vx": "instr_read_v0_vx" + memory,
+        "instr_drw": "instr_drw" if quirks["clipping"] else "instr_drw_wrap",
+        "instr_drw_large": "instr_drw_large" if quirks["clipping"] else "instr_drw_large_wrap",
+    }
@@ -0,0 +1,132 @@
+from chip8.quirks import DEFAULT_PROFILE
+from chip8.savestate import save_state, load_state
+import base64
+import hashlib
+import json
+
+# version 2 added recordings starting from a save state, version 1 recordings still play
+VERSION = 2
+
+# a checkpoint of the screen is recorded every this many frames
+CHECKPOINT_FRAMES = 60
+
+
+def screen_digest(display) -> str:
+    return hashlib.sha1(display.to_bytes()).hexdigest()
+
+
+class InputRecorder(object):
+    """
+    Logs keypad changes by cycle number, plus a hash of the screen every CHECKPOINT_FRAMES frames.
+    Together with the ROM, the RNG seed and the instructions per frame this is enough to replay a session exactly.
+    Rewinding cuts the recording back to the restored point, loading a save state starts it over from that state.
+    """
+
+    def __init__(self, cpu, rom: bytes, seed: int):
+        self.cpu = cpu
+        self.rom = rom
+        self.seed = seed
+
+        # [cycle, keypad state] for every change
+        self.events = []
+        # [frame, screen digest]
+        self.checkpoints = []
+        self.keypad = 0
+        # save state the recording starts from, None to start from power-on
+        self.start = None
+
+    def record_input(self):
+        """
+        Call before running, after the pressed keys were updated
+        """
+        state = self.cpu.keypad
+        if state != self.keypad:
+            self.events.append([self.cpu.cycles, state])
+            self.keypad = state
+
+    def record_frame(self):
+        """
+        Call after running a frame
+        """
+        cpu = self.cpu
+        if cpu.frame_cycle == 0 and cpu.frame % CHECKPOINT_FRAMES == 0:
+            self.checkpoints.append([cpu.frame, screen_digest(cpu.display)])
+
+    def rewound(self):
+        """
+        Call after the CPU was rewound to an earlier point of this session, everything recorded after it is dropped
+        """
+        cycles = self.cpu.cycles
+        self.events = [event for event in self.events if event[0] < cycles]
+        self.checkpoints = [checkpoint for checkpoint in self.checkpoints if checkpoint[0] <= self.cpu.frame]
+        self.keypad = self.events[-1][1] if self.events else 0
+
+    def restarted(self):
+        """
+        Call after a save state was loaded into the CPU, the recording starts over from it
+        """
+        self.start = save_state(self.cpu)
+        self.events = []
+        self.checkpoints = []
+        # a replay starts with no keys pressed
+        self.keypad = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "version": VERSION,
+            "rom_sha1": hashlib.sha1(self.rom).hexdigest(),
+            "seed": self.seed,
+            "cycles_per_frame": self.cpu.cycles_per_frame,
+            "quirks": self.cpu.quirk_profile,
+            "cycles": self.cpu.cycles,
+            "events": self.events,
+            "checkpoints": self.checkpoints,
+            "state": None if self.start is None else base64.b64encode(self.start).decode(),
+        }
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f)
+
+
+def load_recording(path: str) -> dict:
+    with open(path) as f:
+        recording = json.load(f)
+    if recording.get("version") not in (1, VERSION):
+        raise Exception(f"Unsupported recording version {recording.get('version')}")
+    return recording
+
+
+def restore(cpu, recording: dict):
+    """
+    Load the save state a recording starts from into a freshly loaded CPU, if it was made after loading a state
+    """
+    if recording.get("state"):
+        load_state(cpu, base64.b64decode(recording["state"]))
+
+
+def replay(cpu, recording: dict) -> list:
+    """
+    Feed a recording into a freshly loaded CPU, created with the recorded seed, instructions per frame and quirk profile,
+    after restore(). Runs as fast as possible without a window.
+
+    :returns:
+        frames whose screen differs from the recorded checkpoint
+    """
+    if cpu.cycles_per_frame != recording["cycles_per_frame"]:
+        raise Exception("Recording was made with a different number of instructions per frame")
+    if cpu.quirk_profile != recording.get("quirks", DEFAULT_PROFILE):
+        raise Exception("Recording was made with a different quirk profile")
+
+    checkpoints = dict(recording["checkpoints"])
+    mismatches = []
+    events = recording["events"] + [[recording["cycles"], None]]
+    for cycle, state in events:
+        while cpu.cycles < cycle:
+            cpu.run(min(cycle - cpu.cycles, cpu.cycles_per_frame - cpu.frame_cycle))
+            expected = checkpoints.get(cpu.frame) if cpu.frame_cycle == 0 else None
+            if expected is not None and expected != screen_digest(cpu.display):
+                mismatches.append(cpu.frame)
+        if state is not None:
+            cpu.keypad = state
+    return mismatches
@@ -0,0 +1,181 @@
+from collections import deque
+import struct
+import zlib
+
+MAGIC = b"C8SS"
+VERSION = 3
+
+STACK_SLOTS = 16
+
+# magic, version, V0-VF, I, PC, stack depth, stack, delay timer, sound timer,
+# frames the timers were set in, frame, frame cycle, cycles per frame, key waited for in Fx0A,
+# memory size, screen width, screen height, quirk profile name, exited (00FD)
+HEADER = struct.Struct(f"<4sB16sIIB{STACK_SLOTS}HBBQQQIIbIHH16sB")
+
+# state of the random number generator for Cxnn (random.Random.getstate()):
+# version, Mersenne Twister state (624 words and position), whether a gauss() value is pending, that value
+RANDOM = struct.Struct("<B625I?d")
+
+
+def save_state(cpu) -> bytes:
+    """
+    Serialize the complete machine state of a Chip8CPU into a compact binary snapshot.
+    Layout: fixed size header, random number generator, then memory, then the framebuffer packed row by row.
+    """
+    if len(cpu.stack) > STACK_SLOTS:
+        raise Exception(f"Stack deeper than {STACK_SLOTS} entries cannot be saved")
+
+    display = cpu.display
+    header = HEADER.pack(
+        MAGIC,
+        VERSION,
+        bytes(cpu.v),
+        cpu.I,
+        cpu.pc,
+        len(cpu.stack),
+        *(cpu.stack + [0] * (STACK_SLOTS - len(cpu.stack))),
+        cpu.timers["delay"],
+        cpu.timers["sound"],
+        cpu.timer_frames["delay"],
+        cpu.timer_frames["sound"],
+        cpu.frame,
+        cpu.frame_cycle,
+        cpu.cycles_per_frame,
+        -1 if cpu.key_wait is None else cpu.key_wait,
+        len(cpu.memory),
+        display.width,
+        display.height,
+        cpu.quirk_profile.encode(),
+        cpu.exited,
+    )
+    version, words, gauss = cpu.random.getstate()
+    random = RANDOM.pack(version, *words, gauss is not None, gauss or 0.0)
+    return header + random + bytes(cpu.memory) + display.to_bytes()
+
+
+def load_state(cpu, state: bytes):
+    """
+    Restore a snapshot created by save_state() into a Chip8CPU
+    """
+    (
+        magic,
+        version,
+        v,
+        I,
+        pc,
+        depth,
+        *values,
+    ) = HEADER.unpack_from(state)
+    if magic != MAGIC:
+        raise Exception("Not a CHIP-8 save state")
+    if version != VERSION:
+        raise Exception(f"Unsupported save state version {version}")
+
+    stack = values[:STACK_SLOTS]
+    (
+        delay,
+        sound,
+        delay_frame,
+        sound_frame,
+        frame,
+        frame_cycle,
+        cycles_per_frame,
+        key_wait,
+        memory_size,
+        width,
+        height,
+        quirks,
+        exited,
+    ) = values[STACK_SLOTS:]
+    if memory_size != len(cpu.memory):
+        raise Exception("Save state does not match this machine")
+    if quirks.rstrip(b"\0").decode() != cpu.quirk_profile:
+        raise Exception("Save state was made with a different quirk profile")
+
+    cpu.v[:] = v
+    cpu.I = I
+    cpu.pc = pc
+    cpu.stack[:] = stack[:depth]
+    cpu.timers["delay"] = delay
+    cpu.timers["sound"] = sound
+    cpu.timer_frames["delay"] = delay_frame
+    cpu.timer_frames["sound"] = sound_frame
+    cpu.frame = frame
+    cpu.frame_cycle = frame_cycle
+    cpu.cycles_per_frame = cycles_per_frame
+    cpu.key_wait = None if key_wait < 0 else key_wait
+    cpu.exited = bool(exited)
+
+    random_version, *words, has_gauss, gauss = RANDOM.unpack_from(state, HEADER.size)
+    cpu.random.setstate((random_version, tuple(words), gauss if has_gauss else None))
+
+    offset = HEADER.size + RANDOM.size
+    cpu.load_memory(state[offset:offset + memory_size], 0)
+    # the state may have been saved in the other SUPER-CHIP resolution
+    if (width, height) != (cpu.display.width, cpu.display.height):
+        cpu.display.set_resolution(width, height)
+    cpu.display.load_bytes(state[offset + memory_size:])
+
+
+def xor_bytes(a: bytes, b: bytes) -> bytes:
+    """
+    XOR of two states, the shorter one padded with zeros (states grow in hi-res mode)
+    """
+    return (int.from_bytes(a, "little") ^ int.from_bytes(b, "little")).to_bytes(max(len(a), len(b)), "little")
+
+
+class RewindBuffer(object):
+    """
+    Ring buffer of past machine states for rewinding.
+    Only the newest state is kept in full, every older one is stored as the
+    compressed XOR against its successor, which is mostly zeros.
+    """
+
+    def __init__(self, capacity: int = 60 * 60):
+        # deltas to step back from one state to the previous one, newest last,
+        # as (length of the previous state, compressed XOR)
+        self.deltas = deque(maxlen=capacity)
+        self.latest = None
+
+    def __len__(self):
+        return len(self.deltas)
+
+    def push(self, cpu):
+        """
+        Record the current state, usually once per frame
+        """
+        state = save_state(cpu)
+        if self.latest is not None:
+            self.deltas.append((len(self.latest), zlib.compress(xor_bytes(state, self.latest), 1)))
+        self.latest = state
+
+    def clear(self):
+        """
+        Forget all recorded states
+        """
+        self.deltas.clear()
+        self.latest = None
+
+    def rewind(self, cpu, steps: int = 1) -> int:
+        """
+        Step back up to the given number of recorded states and restore the result into cpu.
+
+        :returns:
+            number of steps actually rewound
+        """
+        if self.latest is None:
+            return 0
+
+        done = 0
+        while done < steps and self.deltas:
+            length, delta = self.deltas.pop()
+            self.latest = xor_bytes(self.latest, zlib.decompress(delta))[:length]
+            done += 1
+        load_state(cpu, self.latest)
+        return done
+
+    def size(self) -> int:
+        """
+        Bytes used by the recorded history
+        """
+        return sum(len(delta) for _, delta in self.deltas) + len(self.latest or b"")
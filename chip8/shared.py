@@ -0,0 +1,190 @@
+from chip8.framebuffer import HIRES_WIDTH, HIRES_HEIGHT
+from multiprocessing import shared_memory, resource_tracker
+import struct
+
+MAGIC = b"C8SM"
+VERSION = 2
+
+STACK_SLOTS = 16
+
+# magic, version, memory size, screen width, screen height, sequence number.
+# The screen size is the current one and is published with every frame,
+# room is kept for the SUPER-CHIP hi-res screen.
+HEADER = struct.Struct("<4sBxIHHI")
+SIZE_OFFSET = 10
+SIZE = struct.Struct("<HH")
+
+# PC, I, stack depth, stack, delay timer, sound timer, frames the timers were set in,
+# frame, frame cycle, cycles per frame, key waited for in Fx0A, keypad
+REGISTERS = struct.Struct(f"<IIB{STACK_SLOTS}HBBQQQIIbH")
+
+SEQUENCE_OFFSET = HEADER.size - 4
+REGISTERS_OFFSET = HEADER.size
+V_OFFSET = REGISTERS_OFFSET + REGISTERS.size
+MEMORY_OFFSET = V_OFFSET + 16
+
+
+def layout(memory_size: int):
+    """
+    Offset of the framebuffer and total size of the buffer
+    """
+    screen_offset = MEMORY_OFFSET + memory_size
+    return screen_offset, screen_offset + HIRES_WIDTH * HIRES_HEIGHT // 8
+
+
+class SharedState(object):
+    """
+    Keeps a CPU's state in one contiguous shared memory buffer that other processes can attach to by name.
+    V0-VF and memory are moved into the buffer and used from there, so observers see them live.
+    PC, I, stack, timers, clock and framebuffer stay in fast Python attributes and are published
+    to the buffer by publish(), once per frame, guarded by a sequence number (seqlock):
+    it is odd while writing, so readers retry instead of ever blocking the emulator.
+    """
+
+    def __init__(self, cpu, name: str = None):
+        self.cpu = cpu
+        display = cpu.display
+        self.screen_offset, size = layout(len(cpu.memory))
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.name = self.shm.name
+        self.sequence = 0
+
+        buf = self.shm.buf
+        HEADER.pack_into(buf, 0, MAGIC, VERSION, len(cpu.memory), display.width, display.height, 0)
+
+        # from now on the CPU works on views into the buffer
+        v = buf[V_OFFSET:V_OFFSET + 16]
+        v[:] = bytes(cpu.v)
+        cpu.v = v
+        memory = buf[MEMORY_OFFSET:MEMORY_OFFSET + len(cpu.memory)]
+        memory[:] = cpu.memory
+        cpu.memory = memory
+
+        self.publish()
+
+    def publish(self):
+        """
+        Write registers and framebuffer to the buffer, call once per frame
+        """
+        cpu = self.cpu
+        if len(cpu.stack) > STACK_SLOTS:
+            raise Exception(f"Stack deeper than {STACK_SLOTS} entries cannot be shared")
+
+        buf = self.shm.buf
+        self.sequence = (self.sequence + 1) & 0xFFFFFFFF
+        struct.pack_into("<I", buf, SEQUENCE_OFFSET, self.sequence)
+        REGISTERS.pack_into(
+            buf,
+            REGISTERS_OFFSET,
+            cpu.pc,
+            cpu.I,
+            len(cpu.stack),
+            *(cpu.stack + [0] * (STACK_SLOTS - len(cpu.stack))),
+            cpu.get_timer("delay"),
+            cpu.get_timer("sound"),
+            cpu.timer_frames["delay"],
+            cpu.timer_frames["sound"],
+            cpu.frame,
+            cpu.frame_cycle,
+            cpu.cycles_per_frame,
+            -1 if cpu.key_wait is None else cpu.key_wait,
+            cpu.keypad,
+        )
+        display = cpu.display
+        SIZE.pack_into(buf, SIZE_OFFSET, display.width, display.height)
+        screen = display.to_bytes()
+        buf[self.screen_offset:self.screen_offset + len(screen)] = screen
+        self.sequence = (self.sequence + 1) & 0xFFFFFFFF
+        struct.pack_into("<I", buf, SEQUENCE_OFFSET, self.sequence)
+
+    def close(self):
+        """
+        Give the CPU private copies of its state again and remove the shared buffer
+        """
+        cpu = self.cpu
+        v, memory = cpu.v, cpu.memory
+        cpu.v = list(v)
+        cpu.memory = bytearray(memory)
+        # views have to be released before the buffer can be
+        v.release()
+        memory.release()
+        self.shm.close()
+        self.shm.unlink()
+
+
+class SharedStateReader(object):
+    """
+    Attaches to a SharedState of another process and reads consistent snapshots of it
+    """
+
+    def __init__(self, name: str):
+        # the creating process owns the buffer, do not let this one remove it on exit
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # python < 3.13 always tracks it
+            self.shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+
+        magic, version, memory_size, _, _, _ = HEADER.unpack_from(self.shm.buf)
+        if magic != MAGIC:
+            raise Exception("Not a shared CHIP-8 state")
+        if version != VERSION:
+            raise Exception(f"Unsupported shared state version {version}")
+        self.memory_size = memory_size
+        self.screen_offset, self.size = layout(memory_size)
+
+    def snapshot(self) -> bytes:
+        """
+        Copy the whole buffer at once, retrying while a frame is being published
+        """
+        buf = self.shm.buf
+        while True:
+            before = struct.unpack_from("<I", buf, SEQUENCE_OFFSET)[0]
+            if before % 2:
+                continue
+            data = bytes(buf[:self.size])
+            if struct.unpack_from("<I", buf, SEQUENCE_OFFSET)[0] == before:
+                return data
+
+    def read(self) -> dict:
+        """
+        Snapshot decoded into registers, memory and framebuffer rows.
+        V0-VF and memory are live and may be ahead of the published registers.
+        """
+        data = self.snapshot()
+        (
+            pc,
+            I,
+            depth,
+            *values,
+        ) = REGISTERS.unpack_from(data, REGISTERS_OFFSET)
+        stack = values[:STACK_SLOTS]
+        delay, sound, _, _, frame, frame_cycle, cycles_per_frame, key_wait, keypad = values[STACK_SLOTS:]
+        width, height = SIZE.unpack_from(data, SIZE_OFFSET)
+        row_bytes = width // 8
+        screen = data[self.screen_offset:]
+        return {
+            "sequence": struct.unpack_from("<I", data, SEQUENCE_OFFSET)[0],
+            "pc": pc,
+            "I": I,
+            "stack": list(stack[:depth]),
+            "delay": delay,
+            "sound": sound,
+            "frame": frame,
+            "frame_cycle": frame_cycle,
+            "cycles_per_frame": cycles_per_frame,
+            "key_wait": None if key_wait < 0 else key_wait,
+            "keypad": keypad,
+            "v": list(data[V_OFFSET:V_OFFSET + 16]),
+            "memory": data[MEMORY_OFFSET:MEMORY_OFFSET + self.memory_size],
+            "width": width,
+            "height": height,
+            "rows": [
+                int.from_bytes(screen[y * row_bytes:(y + 1) * row_bytes], "big")
+                for y in range(height)
+            ],
+        }
+
+    def close(self):
+        self.shm.close()
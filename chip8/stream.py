@@ -0,0 +1,215 @@
+import asyncio
+import struct
+
+MAGIC = b"C8FS"
+VERSION = 1
+
+# server -> client, once after connecting: magic, version
+HELLO = struct.Struct("<4sB")
+# server -> client: frame number, screen width, screen height, number of changed rows,
+# followed by the changed rows, each as its row index (one byte) and the row's pixels (width / 8 bytes)
+FRAME = struct.Struct("<IHHB")
+# client -> server: pressed keys, bit n = key n
+KEYPAD = struct.Struct("<H")
+
+# a client is not sent anything new while more than this many bytes wait to be sent to it
+WRITE_BUFFER = 4096
+
+
+def encode_frame(frame: int, width: int, height: int, rows: list, previous: list) -> bytes:
+    """
+    Update message with every row that differs from previous (the rows the client has).
+    All rows are sent if previous is None or has another size.
+    """
+    row_bytes = width // 8
+    if previous is None or len(previous) != height:
+        changed = range(height)
+    else:
+        changed = [y for y in range(height) if rows[y] != previous[y]]
+    parts = [FRAME.pack(frame, width, height, len(changed))]
+    for y in changed:
+        parts.append(bytes((y,)))
+        parts.append(rows[y].to_bytes(row_bytes, "big"))
+    return b"".join(parts)
+
+
+class StreamClient(object):
+    """
+    Connection of a single viewer, as seen by the server
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.task = asyncio.current_task()
+        # set when a new frame was published
+        self.ready = asyncio.Event()
+        # rows the viewer has, None before the first frame
+        self.rows = None
+        self.keypad = 0
+
+
+class FrameServer(object):
+    """
+    Streams the framebuffer of a CPU to any number of viewers over TCP or a Unix socket, and takes keypad input from them.
+    Runs on the asyncio loop of the emulation: call publish() after every frame and yield to the loop in between.
+    Only changed rows are sent. Every viewer is sent the newest frame as soon as its previous update has been written,
+    frames published in the meantime are merged, so a slow viewer never holds up the emulation or the other viewers.
+    Keys held on any viewer count as pressed.
+    """
+
+    def __init__(self, cpu):
+        self.cpu = cpu
+        self.clients = set()
+        self.servers = []
+        # frames published while a viewer was still busy with an earlier one, merged into its next update, over all viewers
+        self.merged = 0
+
+        self.frame = cpu.frame
+        self.width = cpu.display.width
+        self.rows = list(cpu.display.rows)
+
+    async def start_tcp(self, host: str, port: int):
+        self.servers.append(await asyncio.start_server(self.serve_client, host, port))
+
+    async def start_unix(self, path: str):
+        self.servers.append(await asyncio.start_unix_server(self.serve_client, path))
+
+    def sockets(self) -> list:
+        """
+        Addresses listened on
+        """
+        return [sock.getsockname() for server in self.servers for sock in server.sockets]
+
+    def publish(self):
+        """
+        Hand the current frame to every viewer, call once per frame
+        """
+        self.frame = self.cpu.frame
+        # the resolution goes with the rows, the display may switch it (00FE, 00FF) before a viewer is served
+        self.width = self.cpu.display.width
+        self.rows = list(self.cpu.display.rows)
+        for client in self.clients:
+            if client.ready.is_set():
+                self.merged += 1
+            client.ready.set()
+
+    def update_keypad(self):
+        keypad = 0
+        for client in self.clients:
+            keypad |= client.keypad
+        self.cpu.keypad = keypad
+
+    async def serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        client = StreamClient(reader, writer)
+        writer.transport.set_write_buffer_limits(WRITE_BUFFER)
+        writer.write(HELLO.pack(MAGIC, VERSION))
+        client.ready.set()
+        self.clients.add(client)
+        receiver = asyncio.ensure_future(self.receive_input(client))
+        try:
+            while not receiver.done():
+                ready = asyncio.ensure_future(client.ready.wait())
+                await asyncio.wait((ready, receiver), return_when=asyncio.FIRST_COMPLETED)
+                if not ready.done():
+                    ready.cancel()
+                    break
+                client.ready.clear()
+
+                rows = self.rows
+                if client.rows is None or rows != client.rows:
+                    writer.write(encode_frame(self.frame, self.width, len(rows), rows, client.rows))
+                    client.rows = rows
+                # waits only while the socket is full, frames published meanwhile are merged
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            receiver.cancel()
+            self.clients.discard(client)
+            self.update_keypad()
+            writer.close()
+
+    async def receive_input(self, client: StreamClient):
+        """
+        Read keypad states until the viewer disconnects
+        """
+        try:
+            while True:
+                data = await client.reader.readexactly(KEYPAD.size)
+                (client.keypad,) = KEYPAD.unpack(data)
+                self.update_keypad()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+
+    async def close(self):
+        for server in self.servers:
+            server.close()
+            await server.wait_closed()
+        # closing the connections ends every client's task, wait for them to clean up
+        clients = list(self.clients)
+        for client in clients:
+            client.writer.close()
+        await asyncio.gather(*(client.task for client in clients), return_exceptions=True)
+
+
+class FrameClient(object):
+    """
+    Viewer side of a FrameServer: applies updates to a local framebuffer and sends keypad changes back.
+    Has press_key() and release_key() like a CPU, so chip8.input.PygameInput can feed it.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.keypad = 0
+        self.frame = None
+
+    @classmethod
+    async def connect_tcp(cls, host: str, port: int):
+        return cls(*await asyncio.open_connection(host, port))
+
+    @classmethod
+    async def connect_unix(cls, path: str):
+        return cls(*await asyncio.open_unix_connection(path))
+
+    async def receive(self, display):
+        """
+        Apply updates to the display until the server goes away.
+        Changed rows are marked dirty, presenting is left to the caller.
+        """
+        magic, version = HELLO.unpack(await self.reader.readexactly(HELLO.size))
+        if magic != MAGIC:
+            raise Exception("Not a CHIP-8 frame stream")
+        if version != VERSION:
+            raise Exception(f"Unsupported frame stream version {version}")
+
+        try:
+            while True:
+                frame, width, height, count = FRAME.unpack(await self.reader.readexactly(FRAME.size))
+                if (width, height) != (display.width, display.height):
+                    # the server switched between SUPER-CHIP resolutions, all rows follow
+                    display.set_resolution(width, height)
+                row_bytes = width // 8
+                data = await self.reader.readexactly(count * (row_bytes + 1))
+                for offset in range(0, len(data), row_bytes + 1):
+                    y = data[offset]
+                    display.rows[y] = int.from_bytes(data[offset + 1:offset + 1 + row_bytes], "big")
+                    display.dirty |= 1 << y
+                self.frame = frame
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+
+    def send_keypad(self):
+        self.writer.write(KEYPAD.pack(self.keypad))
+
+    def press_key(self, key: int):
+        self.keypad |= 1 << key
+        self.send_keypad()
+
+    def release_key(self, key: int):
+        self.keypad &= ~(1 << key)
+        self.send_keypad()
+
+    def close(self):
+        self.writer.close()
@@ -0,0 +1,77 @@
+from chip8.pacing import FramePacer
+from queue import SimpleQueue, Empty
+from threading import Thread
+
+
+class FrameExchange(object):
+    """
+    Hands finished frames from the emulation thread to the presenting thread without locking either.
+    A frame is published as a new immutable snapshot and swapped in with a single reference assignment,
+    which is atomic, so the reader always gets a whole frame. Like a triple buffer, the writer never waits
+    for the reader and the reader always gets the newest frame; frames it had no time for are skipped.
+    """
+
+    def __init__(self, display):
+        # (sequence number, screen width, rows)
+        self.latest = (0, display.width, tuple(display.rows))
+
+    def publish(self, display):
+        self.latest = (self.latest[0] + 1, display.width, tuple(display.rows))
+
+
+class EmulationThread(Thread):
+    """
+    Runs the emulation on a worker thread, one step() per frame paced by a FramePacer,
+    so a stalling window (dragging it, a busy compositor) cannot hold up the virtual clock.
+
+    Keys go through press_key() and release_key() like on a CPU, and are handed to the CPU at the start of every frame,
+    so keys still only change between frames. Anything else touching the machine is passed to call() and run between frames.
+    """
+
+    def __init__(self, cpu, step, pacer: FramePacer):
+        super().__init__(name="emulation", daemon=True)
+        self.cpu = cpu
+        self.step = step
+        self.pacer = pacer
+
+        self.keypad = cpu.keypad
+        self.frames = FrameExchange(cpu.display)
+        self.commands = SimpleQueue()
+        self.running = True
+        # exception which stopped the thread, to be raised on the main thread
+        self.error = None
+
+    def press_key(self, key: int):
+        self.keypad |= 1 << key
+
+    def release_key(self, key: int):
+        self.keypad &= ~(1 << key)
+
+    def call(self, function):
+        """
+        Run function on the emulation thread before the next frame
+        """
+        self.commands.put(function)
+
+    def run(self):
+        try:
+            while self.running:
+                try:
+                    while True:
+                        self.commands.get_nowait()()
+                except Empty:
+                    pass
+                self.cpu.keypad = self.keypad
+                self.step()
+                self.frames.publish(self.cpu.display)
+                self.pacer.wait()
+        except Exception as e:
+            self.error = e
+
+    def stop(self):
+        """
+        Finish the current frame and wait for the thread to end
+        """
+        self.running = False
+        if self.is_alive():
+            self.join()
@@ -0,0 +1,137 @@
+from chip8.cpu_exception import IdleLoopException
+import struct
+
+MAGIC = b"C8TR"
+VERSION = 1
+
+# magic, version, record size
+FILE_HEADER = struct.Struct("<4sBH")
+
+# frame, PC, opcode, I and V0-VF after the instruction ran, flags
+RECORD = struct.Struct("<IHHI16BB")
+
+# flag set on records of instructions which wrote to memory (Fx33, Fx55)
+WROTE_MEMORY = 0x1
+
+
+class Tracer(object):
+    """
+    Records every executed instruction as a fixed-size binary record.
+    Records go to a preallocated ring buffer, keeping only the newest ones,
+    or, with a stream given, are written out each time the buffer is full.
+    Enabling swaps the CPU's execute() for a recording one, so nothing is paid while tracing is off.
+    """
+
+    def __init__(self, cpu, capacity: int = 65536, stream=None):
+        self.cpu = cpu
+        self.capacity = capacity
+        self.buffer = bytearray(capacity * RECORD.size)
+        self.stream = stream
+
+        # next slot to write and number of records written in total
+        self.position = 0
+        self.count = 0
+
+        if stream is not None:
+            stream.write(FILE_HEADER.pack(MAGIC, VERSION, RECORD.size))
+
+    def enable(self):
+        self.cpu.execute = self.execute
+
+    def disable(self):
+        self.cpu.__dict__.pop("execute", None)
+
+    def execute(self, cycles: int):
+        """
+        Chip8CPU.execute() with a record written after every instruction
+        """
+        cpu = self.cpu
+        memory = cpu.memory
+        v = cpu.v
+        op_cache = cpu.op_cache
+        decode = cpu.decode
+        buffer = self.buffer
+        pack_into = RECORD.pack_into
+        size = RECORD.size
+        frame = cpu.frame
+        i = 0
+        try:
+            for i in range(cycles):
+                pc = cpu.pc
+                opcode = (memory[pc] << 8) | memory[pc + 1]
+                cpu.pc = pc + 2
+
+                instr = op_cache.get(opcode)
+                if instr is None:
+                    instr = op_cache[opcode] = decode(opcode)
+                instr()
+
+                flags = WROTE_MEMORY if opcode & 0xF0FF in (0xF033, 0xF055) else 0
+                pack_into(buffer, self.position * size, frame, pc, opcode, cpu.I, *v, flags)
+                self.advance()
+        except IdleLoopException as idle:
+            # record the instruction which found the loop, the skipped passes are not recorded
+            pack_into(buffer, self.position * size, frame, pc, opcode, cpu.I, *v, 0)
+            self.advance()
+            remaining = cycles - i - 1
+            cpu.skipped += remaining - remaining % idle.length
+            self.execute(remaining % idle.length)
+        except Exception:
+            cpu.executed = i + 1
+            raise
+
+    def advance(self):
+        """
+        Move on to the next slot, writing out the buffer when full
+        """
+        self.count += 1
+        self.position += 1
+        if self.position == self.capacity:
+            self.position = 0
+            if self.stream is not None:
+                self.stream.write(self.buffer)
+
+    def records(self) -> bytes:
+        """
+        Records still held in the buffer, oldest first
+        """
+        end = self.position * RECORD.size
+        # once the buffer has been filled, every slot holds a record, starting at the current position
+        if self.count >= self.capacity and self.stream is None:
+            return bytes(self.buffer[end:] + self.buffer[:end])
+        return bytes(self.buffer[:end])
+
+    def flush(self):
+        """
+        Write records not yet written to the stream
+        """
+        if self.stream is not None:
+            self.stream.write(self.buffer[:self.position * RECORD.size])
+            self.position = 0
+            self.stream.flush()
+
+    def save(self, path: str):
+        """
+        Write the records in the ring buffer to a trace file
+        """
+        with open(path, "wb") as f:
+            f.write(FILE_HEADER.pack(MAGIC, VERSION, RECORD.size))
+            f.write(self.records())
+
+
+def read_trace(f):
+    """
+    Read a trace file and yield (frame, pc, opcode, I, registers, flags) for every record
+    """
+    magic, version, size = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+    if magic != MAGIC:
+        raise Exception("Not a CHIP-8 trace")
+    if version != VERSION or size != RECORD.size:
+        raise Exception(f"Unsupported trace version {version}")
+
+    while True:
+        chunk = f.read(size * 4096)
+        if not chunk:
+            return
+        for record in RECORD.iter_unpack(chunk[:len(chunk) - len(chunk) % size]):
+            yield record[0], record[1], record[2], record[3], record[4:20], record[20]
@@ -0,0 +1,302 @@
+from chip8.cpu import Chip8CPU, CYCLES_PER_FRAME, BIG_FONT_ADDRESS
+from chip8.cpu_exception import IdleLoopException
+from chip8.quirks import DEFAULT_PROFILE, PROFILES
+from bisect import bisect_right
+
+# longest run of instructions compiled into one block
+MAX_BLOCK_LENGTH = 64
+
+# blocks are indexed by memory page so writes only have to look at nearby blocks
+PAGE_SHIFT = 5
+
+
+class Chip8TranslatingCPU(Chip8CPU):
+    """
+    Execution engine which compiles straight-line runs of opcodes into python functions.
+    Blocks are cached by start address and dropped again when memory they were built from gets written.
+    """
+
+    def __init__(self, display, debug: bool = False, cycles_per_frame: int = CYCLES_PER_FRAME, seed=None,
+                 quirks: str = DEFAULT_PROFILE):
+        super().__init__(display, debug, cycles_per_frame, seed, quirks)
+
+        # start address -> (compiled block, end address, number of instructions,
+        #                   first line of generated code of every instruction)
+        # blocks cut short to fit the end of a frame are keyed by (start address, length)
+        self.blocks = {}
+
+        # memory page -> keys of blocks covering that page
+        self.block_pages = {}
+
+    def execute(self, cycles: int):
+        """
+        Execute the given number of instructions, a block at a time
+        """
+        if self.debug:
+            super().execute(cycles)
+            return
+
+        blocks = self.blocks
+        remaining = cycles
+        try:
+            while remaining > 0:
+                block = blocks.get(self.pc)
+                if block is None:
+                    block = self.translate(self.pc)
+                if block is None:
+                    self.execute_instr()
+                    remaining -= 1
+                elif block[2] > remaining:
+                    # the block would run past the frame, use a shorter copy of it
+                    block = blocks.get((self.pc, remaining)) or self.translate(self.pc, remaining)
+                    remaining -= block[0](self)
+                else:
+                    remaining -= block[0](self)
+        except IdleLoopException as idle:
+            # the block (or single instruction) which found the loop has run completely
+            executed = 1 if block is None else block[2]
+            remaining -= executed
+            self.skipped += remaining - remaining % idle.length
+            self.execute(remaining % idle.length)
+        except Exception as e:
+            if block is None:
+                self.executed = cycles - remaining + 1
+            else:
+                # the instructions of the block before the failing one have run,
+                # leave the PC behind the failing one like the interpreter does
+                index = self.failed_instruction(block, e.__traceback__)
+                self.executed = cycles - remaining + index + 1
+                self.pc = block[1] - 2 * (block[2] - index - 1)
+            raise
+
+    @staticmethod
+    def failed_instruction(block, traceback) -> int:
+        """
+        Index within the block of the instruction which raised, found by the line of generated code it raised in
+        """
+        code = block[0].__code__
+        while traceback is not None:
+            if traceback.tb_frame.f_code is code:
+                return bisect_right(block[3], traceback.tb_lineno) - 1
+            traceback = traceback.tb_next
+        return 0
+
+    def translate(self, start: int, length: int = MAX_BLOCK_LENGTH):
+        """
+        Compile up to length instructions starting at start into one function and cache it
+        """
+        lines = []
+        # line numbers in the generated source where every instruction starts, after the three lines of the prologue
+        line_starts = []
+        pc = start
+        count = 0
+        ended = False
+        while count < length and pc + 1 < len(self.memory):
+            opcode = (self.memory[pc] << 8) | self.memory[pc + 1]
+            code = translate_opcode(opcode, pc + 2, self.quirks)
+            if code is None:
+                break
+            body, ended = code
+            line_starts.append(len(lines) + 4)
+            count += 1
+            pc += 2
+            lines.extend(body)
+            if ended:
+                lines.append(f"return {count}")
+                break
+
+        if count == 0:
+            return None
+        if not ended:
+            lines.append(f"cpu.pc = {pc}")
+            lines.append(f"return {count}")
+
+        source = "def block(cpu):\n    v = cpu.v\n    memory = cpu.memory\n"
+        source += "".join(f"    {line}\n" for line in lines)
+        namespace = {}
+        exec(compile(source, f"<chip8 block {hex(start)}>", "exec"), namespace)
+
+        block = (namespace["block"], pc, count, line_starts)
+        key = start if length == MAX_BLOCK_LENGTH else (start, length)
+        self.blocks[key] = block
+        for page in range(start >> PAGE_SHIFT, ((pc - 1) >> PAGE_SHIFT) + 1):
+            self.block_pages.setdefault(page, set()).add(key)
+        return block
+
+    def invalidate(self, start: int, end: int):
+        """
+        Drop all blocks overlapping memory from start to end (exclusive)
+        """
+        for page in range(start >> PAGE_SHIFT, ((end - 1) >> PAGE_SHIFT) + 1):
+            keys = self.block_pages.get(page)
+            if not keys:
+                continue
+            for key in list(keys):
+                block = self.blocks.get(key)
+                block_start = key if isinstance(key, int) else key[0]
+                if block is None:
+                    keys.discard(key)
+                elif block_start < end and block[1] > start:
+                    del self.blocks[key]
+                    keys.discard(key)
+
+    def load_memory(self, memory: bytearray, offset: int):
+        super().load_memory(memory, offset)
+        self.invalidate(offset, offset + len(memory))
+
+    def instr_ld_bcd_vx_i(self, x):
+        I = self.I
+        super().instr_ld_bcd_vx_i(x)
+        self.invalidate(I, I + 3)
+
+    def instr_store_v0_vx(self, x):
+        I = self.I
+        super().instr_store_v0_vx(x)
+        self.invalidate(I, I + x + 1)
+
+    def instr_store_v0_vx_chip48(self, x):
+        I = self.I
+        super().instr_store_v0_vx_chip48(x)
+        self.invalidate(I, I + x + 1)
+
+    def instr_store_v0_vx_keep_i(self, x):
+        I = self.I
+        super().instr_store_v0_vx_keep_i(x)
+        self.invalidate(I, I + x + 1)
+
+
+def translate_opcode(opcode: int, next_pc: int, quirks: dict = PROFILES[DEFAULT_PROFILE]):
+    """
+    Translate a single opcode into python source.
+    next_pc is the address of the following instruction.
+    Instructions depending on quirks are translated for the given profile only.
+
+    :returns:
+        (lines of code, whether the block ends here) or None if the opcode cannot be translated
+    """
+    x = (opcode & 0x0F00) >> 8
+    y = (opcode & 0x00F0) >> 4
+    n = opcode & 0x000F
+    nn = opcode & 0x00FF
+    nnn = opcode & 0x0FFF
+
+    # quirk dependent pieces of code
+    vf_reset = ["v[15] = 0"] if quirks["vf_reset"] else []
+    shifted = x if quirks["shifting"] else y
+    offset = x if quirks["jumping"] else 0
+    increment = {"increment": x + 1, "chip48": x, "keep": 0}[quirks["memory"]]
+    extended = quirks["extended"]
+
+    # skip instructions end the block with a conditional jump
+    def skip(condition):
+        return [
+            f"if {condition}:",
+            f"    cpu.pc = {next_pc + 2}",
+            "else:",
+            f"    cpu.pc = {next_pc}",
+        ], True
+
+    # instructions handled by the interpreter methods
+    def call(method, *args, ends=False):
+        lines = []
+        if ends:
+            lines.append(f"cpu.pc = {next_pc}")
+        lines.append(f"cpu.{method}({', '.join(str(arg) for arg in args)})")
+        return lines, ends
+
+    match (opcode >> 12, x, y, n):
+        case (0x0, 0x0, 0xE, 0x0):  # 00E0 (clear screen)
+            return ["cpu.display.clear()"], False
+        case (0x0, 0x0, 0xE, 0xE):  # 00EE (return from subroutine)
+            return ["cpu.pc = cpu.stack.pop()"], True
+        case (0x0, 0x0, 0xC, _) if extended:  # 00Cn (scroll down n rows)
+            return call("instr_scd", n)
+        case (0x0, 0x0, 0xF, 0xB) if extended:  # 00FB (scroll right 4 pixels)
+            return call("instr_scr")
+        case (0x0, 0x0, 0xF, 0xC) if extended:  # 00FC (scroll left 4 pixels)
+            return call("instr_scl")
+        case (0x0, 0x0, 0xF, 0xE) if extended:  # 00FE (low-res mode)
+            return call("instr_low")
+        case (0x0, 0x0, 0xF, 0xF) if extended:  # 00FF (hi-res mode)
+            return call("instr_high")
+        case (0x1, _, _, _):  # 1xxx (jump)
+            back = next_pc - nnn
+            if back == 2 or back == 6:
+                # jump to itself or to a possible timer polling loop
+                return [f"cpu.pc = {nnn}", f"cpu.check_idle({back // 2})"], True
+            return [f"cpu.pc = {nnn}"], True
+        case (0x2, _, _, _):  # 2xxx (call subroutine)
+            return [f"cpu.stack.append({next_pc})", f"cpu.pc = {nnn}"], True
+        case (0x3, _, _, _):  # 3xyy (skip if Vx == yy)
+            return skip(f"v[{x}] == {nn}")
+        case (0x4, _, _, _):  # 4xyy (skip if Vx != yy)
+            return skip(f"v[{x}] != {nn}")
+        case (0x5, _, _, 0):  # 5xy0 (skip if Vx == Vy)
+            return skip(f"v[{x}] == v[{y}]")
+        case (0x6, _, _, _):  # 6xyy (Vx == yy)
+            return [f"v[{x}] = {nn}"], False
+        case (0x7, _, _, _):  # 7xyy (Vx += yy)
+            return [f"v[{x}] = (v[{x}] + {nn}) & 0xFF"], False
+        case (0x8, _, _, 0x0):  # 8xy0 (Vx = Vy)
+            return [f"v[{x}] = v[{y}]"], False
+        case (0x8, _, _, 0x1):  # 8xy1 (Vx OR Vy)
+            return [f"v[{x}] |= v[{y}]"] + vf_reset, False
+        case (0x8, _, _, 0x2):  # 8xy2 (Vx AND Vy)
+            return [f"v[{x}] &= v[{y}]"] + vf_reset, False
+        case (0x8, _, _, 0x3):  # 8xy3 (Vx XOR Vy)
+            return [f"v[{x}] ^= v[{y}]"] + vf_reset, False
+        case (0x8, _, _, 0x4):  # 8xy4 (Vx += Vy)
+            return [f"r = v[{x}] + v[{y}]", f"v[{x}] = r & 0xFF", "v[15] = r >> 8"], False
+        case (0x8, _, _, 0x5):  # 8xy5 (Vx -= Vy)
+            return [f"r = v[{x}] - v[{y}]", f"v[{x}] = r & 0xFF", "v[15] = 1 if r >= 0 else 0"], False
+        case (0x8, _, _, 0x6):  # 8xy6 (shift-right Vx)
+            return [f"r = v[{shifted}]", f"v[{x}] = r >> 1", "v[15] = r & 0x1"], False
+        case (0x8, _, _, 0x7):  # 8xy7 (Vx = Vy - Vx)
+            return [f"r = v[{y}] - v[{x}]", f"v[{x}] = r & 0xFF", "v[15] = 1 if r >= 0 else 0"], False
+        case (0x8, _, _, 0xE):  # 8xyE (shift-left Vx)
+            return [f"r = v[{shifted}]", f"v[{x}] = (r << 1) & 0xFF", "v[15] = r >> 7"], False
+        case (0x9, _, _, 0x0):  # 9xy0 (skip if Vx != Vy)
+            return skip(f"v[{x}] != v[{y}]")
+        case (0xA, _, _, _):  # Annn (I = nnn)
+            return [f"cpu.I = {nnn}"], False
+        case (0xB, _, _, _):  # Bnnn (PC = xxx + v0)
+            return [f"cpu.pc = {nnn} + v[{offset}]"], True
+        case (0xC, _, _, _):  # Cxnn (Vx = random)
+            return [f"v[{x}] = cpu.random.randint(0, 255) & {nn}"], False
+        case (0xD, _, _, 0x0) if extended:  # Dxy0 (draw 16x16 sprite)
+            return call("instr_drw_large", x, y)
+        case (0xD, _, _, _):  # Dxyz (draw)
+            return call("instr_drw", x, y, n)
+        case (0xE, _, 0x9, 0xE):  # Ex9E (skip if key with value Vx is pressed)
+            return skip(f"(cpu.keypad >> v[{x}]) & 1")
+        case (0xE, _, 0xA, 0x1):  # ExA1 (skip if key with value vx is not pressed)
+            return skip(f"not (cpu.keypad >> v[{x}]) & 1")
+        case (0xF, _, 0x0, 0x7):  # Fx07 (Vx = delay timer)
+            return [f"v[{x}] = cpu.get_timer('delay')"], False
+        case (0xF, _, 0x1, 0x5):  # Fx15 (delay timer = Vx)
+            return [f"cpu.set_timer('delay', v[{x}])"], False
+        case (0xF, _, 0x1, 0x8):  # Fx18 (sound timer = Vx, no sound is played)
+            return [f"cpu.set_timer('sound', v[{x}])"], False
+        case (0xF, _, 0x1, 0xE):  # Fx1E (I += Vx)
+            return [f"cpu.I += v[{x}]"], False
+        case (0xF, _, 0x2, 0x9):  # Fx29 (Load sprite for nibble at Vx)
+            return [f"cpu.I = v[{x}] * 10"], False
+        case (0xF, _, 0x3, 0x0) if extended:  # Fx30 (Load big sprite for digit at Vx)
+            return [f"cpu.I = {BIG_FONT_ADDRESS} + (v[{x}] & 15) * 10"], False
+        case (0xF, _, 0x3, 0x3):  # Fx33 (Store decimal number at I)
+            # writes memory, end block so a rewritten instruction is never run from a stale block
+            return call("instr_ld_bcd_vx_i", x, ends=True)
+        case (0xF, _, 0x5, 0x5):  # Fx55 (Store V0 to Vx starting at I)
+            return call("instr_store_v0_vx", x, ends=True)
+        case (0xF, _, 0x6, 0x5):  # Fx65 (Read V0 to Vx starting at I)
+            lines = ["I = cpu.I"]
+            lines.extend(f"v[{i}] = memory[I + {i}]" for i in range(x + 1))
+            if increment:
+                lines.append(f"cpu.I = I + {increment}")
+            return lines, False
+        case (0xF, _, 0x7, 0x5) if extended:  # Fx75 (Store V0 to Vx in RPL flags)
+            return call("instr_store_rpl", x)
+        case (0xF, _, 0x8, 0x5) if extended:  # Fx85 (Read V0 to Vx from RPL flags)
+            return call("instr_read_rpl", x)
+        case _:  # Fx0A, 00FD and unknown opcodes are left to the interpreter
+            return None
@@ -0,0 +1,461 @@
+from chip8.cpu import CYCLES_PER_FRAME, KEY_ORDER, MEMORY_SIZE
+from chip8.quirks import DEFAULT_PROFILE, get_profile
+from timeit import default_timer as timer
+import numpy as np
+
+STACK_SIZE = 16
+WIDTH = 64
+HEIGHT = 32
+
+# Fx0A respects keys in the same order as Chip8CPU
+KEY_ORDER = np.array(KEY_ORDER, dtype=np.int32)
+
+
+class Chip8VectorCPU(object):
+    """
+    Runs many CHIP-8 machines in lockstep.
+    Registers, stack, timers, memory and framebuffers of all machines are NumPy arrays,
+    every step decodes the current opcode of all machines and applies each opcode class
+    to the machines executing it with masked array operations.
+
+    Opcode semantics and quirks follow Chip8CPU with the chip8 quirk profile, with these differences:
+    the stack is limited to 16 entries, Cxnn uses a NumPy random generator,
+    and machines hitting an unknown opcode or a memory / stack fault halt instead of raising.
+    No other quirk profile (and so no SUPER-CHIP instruction) is implemented, asking for one raises.
+    """
+
+    def __init__(self, count: int, cycles_per_frame: int = CYCLES_PER_FRAME, seed=None, quirks: str = DEFAULT_PROFILE):
+        get_profile(quirks)
+        if quirks != DEFAULT_PROFILE:
+            raise Exception(f"The vector engine only implements the {DEFAULT_PROFILE} quirk profile, not {quirks}")
+        self.quirk_profile = quirks
+
+        self.count = count
+        self.cycles_per_frame = cycles_per_frame
+
+        self.v = np.zeros((count, 16), dtype=np.int32)
+        self.I = np.zeros(count, dtype=np.int32)
+        self.pc = np.full(count, 0x200, dtype=np.int32)
+        self.sp = np.zeros(count, dtype=np.int32)
+        self.stack = np.zeros((count, STACK_SIZE), dtype=np.int32)
+
+        # timers as in Chip8CPU: value when set and frame they were set in
+        self.delay = np.zeros(count, dtype=np.int32)
+        self.delay_frame = np.zeros(count, dtype=np.int32)
+        self.sound = np.zeros(count, dtype=np.int32)
+        self.sound_frame = np.zeros(count, dtype=np.int32)
+
+        # virtual clock, shared by all machines
+        self.frame = 0
+        self.frame_cycle = 0
+
+        # keypad state as bitmask (bit n = key n) and key waited for in Fx0A (-1 if none)
+        self.keypad = np.zeros(count, dtype=np.int32)
+        self.key_wait = np.full(count, -1, dtype=np.int32)
+
+        # every screen row is a 64 bit integer, leftmost pixel is the most significant bit
+        self.rows = np.zeros((count, HEIGHT), dtype=np.uint64)
+
+        # Shared-ROM fast path: as long as no machine wrote to memory all of them read
+        # from this single array. It gets copied per machine on the first write.
+        self.shared_memory = np.zeros(MEMORY_SIZE, dtype=np.uint8)
+        self.memory = None
+
+        # halted machines and the opcode that halted them
+        self.halted = np.zeros(count, dtype=bool)
+        self.error = np.full(count, -1, dtype=np.int32)
+
+        self.rng = np.random.default_rng(seed)
+
+        # statistics for instructions per second
+        self.instructions = 0
+        self.elapsed = 0.0
+
+        self.all = np.arange(count)
+
+    ##############
+    ### Memory ###
+    ##############
+
+    def load_memory(self, memory: bytearray, offset: int, machines=None):
+        """
+        Load bytearray into memory at given offset.
+        Loads into all machines unless a list of machine indices is given.
+        """
+        if (len(memory) + offset) > MEMORY_SIZE:
+            raise Exception(f"Memory limit of {MEMORY_SIZE} exceeded")
+
+        data = np.frombuffer(bytes(memory), dtype=np.uint8)
+        if machines is None and self.memory is None:
+            self.shared_memory[offset:offset + len(data)] = data
+            return
+
+        self.unshare_memory()
+        if machines is None:
+            machines = self.all
+        self.memory[np.asarray(machines)[:, None], np.arange(offset, offset + len(data))] = data
+
+    def unshare_memory(self):
+        """
+        Give every machine its own copy of memory
+        """
+        if self.memory is None:
+            self.memory = np.tile(self.shared_memory, (self.count, 1))
+
+    def read(self, idx, addr):
+        """
+        Read one byte per machine. Addresses outside of memory read as 0.
+        """
+        valid = addr < MEMORY_SIZE
+        addr = np.where(valid, addr, 0)
+        if self.memory is None:
+            values = self.shared_memory[addr]
+        else:
+            values = self.memory[idx, addr]
+        return np.where(valid, values.astype(np.int32), 0)
+
+    def write(self, idx, addr, values):
+        """
+        Write one byte per machine. Machines writing outside of memory halt.
+        """
+        self.unshare_memory()
+        valid = addr < MEMORY_SIZE
+        self.memory[idx[valid], addr[valid]] = values[valid] & 0xFF
+        return valid
+
+    ###################
+    ### Virtual CPU ###
+    ###################
+
+    def run(self, cycles: int):
+        """
+        Execute the given number of steps on all machines, on the same virtual clock as Chip8CPU
+        """
+        start = timer()
+        while cycles > 0:
+            batch = min(cycles, self.cycles_per_frame - self.frame_cycle)
+            for _ in range(batch):
+                self.step()
+            cycles -= batch
+
+            self.frame_cycle += batch
+            if self.frame_cycle >= self.cycles_per_frame:
+                self.frame_cycle = 0
+                self.frame += 1
+        self.elapsed += timer() - start
+
+    def run_frame(self):
+        """
+        Execute steps until the current frame is over
+        """
+        self.run(self.cycles_per_frame - self.frame_cycle)
+
+    @property
+    def instructions_per_second(self) -> float:
+        """
+        Aggregate instructions per second over all machines
+        """
+        return self.instructions / self.elapsed if self.elapsed else 0.0
+
+    def halt(self, idx, opcodes):
+        self.halted[idx] = True
+        self.error[idx] = opcodes
+
+    def step(self):
+        """
+        Execute one instruction on every machine which is not halted
+        """
+        idx = np.nonzero(~self.halted)[0]
+        if len(idx) == 0:
+            return
+
+        pc = self.pc[idx]
+        fault = pc + 1 >= MEMORY_SIZE
+        if fault.any():
+            self.halt(idx[fault], -1)
+            idx = idx[~fault]
+            pc = pc[~fault]
+
+        # fetch
+        if self.memory is None:
+            high, low = self.shared_memory[pc], self.shared_memory[pc + 1]
+        else:
+            high, low = self.memory[idx, pc], self.memory[idx, pc + 1]
+        opcode = (high.astype(np.int32) << 8) | low
+        self.pc[idx] = pc + 2
+        self.instructions += len(idx)
+
+        # decode and execute class by class
+        kind = opcode >> 12
+        for k in np.unique(kind):
+            sel = kind == k
+            OPCODE_CLASSES[k](self, idx[sel], opcode[sel])
+
+    ###################
+    ### CPU opcodes ###
+    ###################
+
+    def class_0(self, idx, op):
+        # 00E0: clear display
+        sel = op == 0x00E0
+        self.rows[idx[sel]] = 0
+
+        # 00EE: return from subroutine
+        sel = op == 0x00EE
+        ret = idx[sel]
+        underflow = self.sp[ret] == 0
+        self.halt(ret[underflow], 0x00EE)
+        ret = ret[~underflow]
+        self.sp[ret] -= 1
+        self.pc[ret] = self.stack[ret, self.sp[ret]]
+
+        unknown = (op != 0x00E0) & (op != 0x00EE)
+        self.halt(idx[unknown], op[unknown])
+
+    def class_1(self, idx, op):
+        # 1nnn: jump
+        self.pc[idx] = op & 0x0FFF
+
+    def class_2(self, idx, op):
+        # 2nnn: call subroutine
+        overflow = self.sp[idx] >= STACK_SIZE
+        self.halt(idx[overflow], op[overflow])
+        idx = idx[~overflow]
+        op = op[~overflow]
+        self.stack[idx, self.sp[idx]] = self.pc[idx]
+        self.sp[idx] += 1
+        self.pc[idx] = op & 0x0FFF
+
+    def skip(self, idx, condition):
+        self.pc[idx[condition]] += 2
+
+    def class_3(self, idx, op):
+        # 3xnn: skip if Vx == nn
+        self.skip(idx, self.v[idx, (op >> 8) & 0xF] == op & 0xFF)
+
+    def class_4(self, idx, op):
+        # 4xnn: skip if Vx != nn
+        self.skip(idx, self.v[idx, (op >> 8) & 0xF] != op & 0xFF)
+
+    def class_5(self, idx, op):
+        # 5xy0: skip if Vx == Vy
+        self.skip_vx_vy(idx, op, np.equal)
+
+    def class_9(self, idx, op):
+        # 9xy0: skip if Vx != Vy
+        self.skip_vx_vy(idx, op, np.not_equal)
+
+    def skip_vx_vy(self, idx, op, compare):
+        unknown = op & 0xF != 0
+        self.halt(idx[unknown], op[unknown])
+        idx = idx[~unknown]
+        op = op[~unknown]
+        self.skip(idx, compare(self.v[idx, (op >> 8) & 0xF], self.v[idx, (op >> 4) & 0xF]))
+
+    def class_6(self, idx, op):
+        # 6xnn: Vx = nn
+        self.v[idx, (op >> 8) & 0xF] = op & 0xFF
+
+    def class_7(self, idx, op):
+        # 7xnn: Vx += nn
+        x = (op >> 8) & 0xF
+        self.v[idx, x] = (self.v[idx, x] + (op & 0xFF)) & 0xFF
+
+    def class_8(self, idx, op):
+        x = (op >> 8) & 0xF
+        vx = self.v[idx, x]
+        vy = self.v[idx, (op >> 4) & 0xF]
+        n = op & 0xF
+
+        result = np.zeros_like(vx)
+        flag = np.zeros_like(vx)
+        # 8xy0: Vx = Vy
+        result = np.where(n == 0x0, vy, result)
+        # 8xy1, 8xy2, 8xy3: Vx OR / AND / XOR Vy, quirk: VF = 0
+        result = np.where(n == 0x1, vx | vy, result)
+        result = np.where(n == 0x2, vx & vy, result)
+        result = np.where(n == 0x3, vx ^ vy, result)
+        # 8xy4: Vx += Vy, VF = carry
+        total = vx + vy
+        result = np.where(n == 0x4, total & 0xFF, result)
+        flag = np.where(n == 0x4, total >> 8, flag)
+        # 8xy5: Vx -= Vy, VF = not borrow
+        result = np.where(n == 0x5, (vx - vy) & 0xFF, result)
+        flag = np.where(n == 0x5, vx >= vy, flag)
+        # 8xy6: Vx = Vy >> 1, VF = shifted out bit
+        result = np.where(n == 0x6, vy >> 1, result)
+        flag = np.where(n == 0x6, vy & 0x1, flag)
+        # 8xy7: Vx = Vy - Vx, VF = not borrow
+        result = np.where(n == 0x7, (vy - vx) & 0xFF, result)
+        flag = np.where(n == 0x7, vy >= vx, flag)
+        # 8xyE: Vx = Vy << 1, VF = shifted out bit
+        result = np.where(n == 0xE, (vy << 1) & 0xFF, result)
+        flag = np.where(n == 0xE, vy >> 7, flag)
+
+        unknown = ((n > 0x7) & (n != 0xE))
+        self.halt(idx[unknown], op[unknown])
+        known = ~unknown
+        self.v[idx[known], x[known]] = result[known]
+        # VF is written last (except by 8xy0), so it wins if x is F
+        sets_flag = known & (n != 0x0)
+        self.v[idx[sets_flag], 0xF] = flag[sets_flag]
+
+    def class_A(self, idx, op):
+        # Annn: I = nnn
+        self.I[idx] = op & 0x0FFF
+
+    def class_B(self, idx, op):
+        # Bnnn: jump to nnn + V0
+        self.pc[idx] = (op & 0x0FFF) + self.v[idx, 0]
+
+    def class_C(self, idx, op):
+        # Cxnn: Vx = random byte AND nn
+        self.v[idx, (op >> 8) & 0xF] = self.rng.integers(0, 256, size=len(idx)) & (op & 0xFF)
+
+    def class_D(self, idx, op):
+        # Dxyn: draw n-byte sprite from I at (Vx, Vy), clipped at the right and bottom edges
+        x_pos = (self.v[idx, (op >> 8) & 0xF] % WIDTH).astype(np.uint64)
+        y_pos = self.v[idx, (op >> 4) & 0xF] % HEIGHT
+        n = op & 0xF
+        collision = np.zeros(len(idx), dtype=bool)
+
+        # sprite bytes are shifted left to their position, or right when clipped at the right edge
+        left = x_pos <= WIDTH - 8
+        shift_left = np.where(left, WIDTH - 8 - x_pos, 0).astype(np.uint64)
+        shift_right = np.where(left, 0, x_pos - (WIDTH - 8)).astype(np.uint64)
+
+        for row in range(int(n.max(initial=0))):
+            active = (row < n) & (y_pos + row < HEIGHT)
+            if not active.any():
+                continue
+            machines = idx[active]
+            y = y_pos[active] + row
+            sprite = self.read(machines, self.I[machines] + row).astype(np.uint64)
+            mask = (sprite << shift_left[active]) >> shift_right[active]
+            old = self.rows[machines, y]
+            collision[active] |= (old & mask) != 0
+            self.rows[machines, y] = old ^ mask
+
+        self.v[idx, 0xF] = collision
+
+    def class_E(self, idx, op):
+        vx = self.v[idx, (op >> 8) & 0xF]
+        pressed = (vx < 16) & ((self.keypad[idx] >> (vx & 0xF)) & 1 == 1)
+        nn = op & 0xFF
+        # Ex9E: skip if key Vx is pressed
+        self.skip(idx, (nn == 0x9E) & pressed)
+        # ExA1: skip if key Vx is not pressed
+        self.skip(idx, (nn == 0xA1) & ~pressed)
+
+        unknown = (nn != 0x9E) & (nn != 0xA1)
+        self.halt(idx[unknown], op[unknown])
+
+    def class_F(self, idx, op):
+        x = (op >> 8) & 0xF
+        nn = op & 0xFF
+
+        # Fx07: Vx = delay timer
+        sel = nn == 0x07
+        machines = idx[sel]
+        self.v[machines, x[sel]] = np.maximum(0, self.delay[machines] - (self.frame - self.delay_frame[machines]))
+
+        # Fx0A: wait for key press and release, repeating the instruction while waiting
+        sel = nn == 0x0A
+        if sel.any():
+            self.wait_key(idx[sel], x[sel])
+
+        # Fx15: delay timer = Vx
+        sel = nn == 0x15
+        machines = idx[sel]
+        self.delay[machines] = self.v[machines, x[sel]]
+        self.delay_frame[machines] = self.frame
+
+        # Fx18: sound timer = Vx
+        sel = nn == 0x18
+        machines = idx[sel]
+        self.sound[machines] = self.v[machines, x[sel]]
+        self.sound_frame[machines] = self.frame
+
+        # Fx1E: I += Vx
+        sel = nn == 0x1E
+        machines = idx[sel]
+        self.I[machines] += self.v[machines, x[sel]]
+
+        # Fx29: I = location of font sprite for digit Vx
+        sel = nn == 0x29
+        machines = idx[sel]
+        self.I[machines] = self.v[machines, x[sel]] * 10
+
+        # Fx33: store BCD of Vx at I, I+1, I+2
+        sel = nn == 0x33
+        if sel.any():
+            machines = idx[sel]
+            value = self.v[machines, x[sel]]
+            I = self.I[machines]
+            valid = self.write(machines, I, value // 100)
+            valid &= self.write(machines, I + 1, (value % 100) // 10)
+            valid &= self.write(machines, I + 2, value % 10)
+            self.halt(machines[~valid], op[sel][~valid])
+
+        # Fx55: store V0 to Vx at I, quirk: I is incremented
+        sel = nn == 0x55
+        if sel.any():
+            machines = idx[sel]
+            count = x[sel] + 1
+            valid = np.ones(len(machines), dtype=bool)
+            for i in range(int(count.max())):
+                active = i < count
+                valid[active] &= self.write(machines[active], self.I[machines[active]] + i, self.v[machines[active], i])
+            self.I[machines] += count
+            self.halt(machines[~valid], op[sel][~valid])
+
+        # Fx65: read V0 to Vx from I, quirk: I is incremented
+        sel = nn == 0x65
+        if sel.any():
+            machines = idx[sel]
+            count = x[sel] + 1
+            for i in range(int(count.max())):
+                active = i < count
+                self.v[machines[active], i] = self.read(machines[active], self.I[machines[active]] + i)
+            self.I[machines] += count
+
+        unknown = ~np.isin(nn, (0x07, 0x0A, 0x15, 0x18, 0x1E, 0x29, 0x33, 0x55, 0x65))
+        self.halt(idx[unknown], op[unknown])
+
+    def wait_key(self, idx, x):
+        keypad = self.keypad[idx]
+        waiting = self.key_wait[idx]
+
+        # not waiting on a key yet: pick the first pressed key
+        pressed = (keypad[:, None] >> KEY_ORDER[None, :]) & 1 == 1
+        first = KEY_ORDER[np.argmax(pressed, axis=1)]
+        start = (waiting < 0) & pressed.any(axis=1)
+        waiting = np.where(start, first, waiting)
+        self.key_wait[idx] = waiting
+
+        # key released again: store it, otherwise repeat the instruction
+        released = (waiting >= 0) & ~start & ((keypad >> np.maximum(waiting, 0)) & 1 == 0)
+        done = idx[released]
+        self.v[done, x[released]] = waiting[released]
+        self.key_wait[done] = -1
+        self.pc[idx[~released]] -= 2
+
+
+OPCODE_CLASSES = [
+    Chip8VectorCPU.class_0,
+    Chip8VectorCPU.class_1,
+    Chip8VectorCPU.class_2,
+    Chip8VectorCPU.class_3,
+    Chip8VectorCPU.class_4,
+    Chip8VectorCPU.class_5,
+    Chip8VectorCPU.class_6,
+    Chip8VectorCPU.class_7,
+    Chip8VectorCPU.class_8,
+    Chip8VectorCPU.class_9,
+    Chip8VectorCPU.class_A,
+    Chip8VectorCPU.class_B,
+    Chip8VectorCPU.class_C,
+    Chip8VectorCPU.class_D,
+    Chip8VectorCPU.class_E,
+    Chip8VectorCPU.class_F,
+]
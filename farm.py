@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+import os
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from chip8.cpu import Chip8CPU, CYCLES_PER_FRAME
+from chip8.quirks import PROFILES, DEFAULT_PROFILE
+from chip8.cpu_exception import OpcodeNotImplementedException
+from chip8.framebuffer import Chip8Framebuffer
+from chip8.translator import Chip8TranslatingCPU
+from chip8.analyzer import load_analysis, preload
+from concurrent.futures import ProcessPoolExecutor
+from timeit import default_timer as timer
+from argparse import ArgumentParser
+import hashlib
+import json
+import csv
+import sys
+
+FONT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "font.ch8")
+ENGINES = {"interpreter": Chip8CPU, "block": Chip8TranslatingCPU}
+
+
+def run_rom(path: str, frames: int, ipf: int, engine: str, seed: int = 0, quirks: str = DEFAULT_PROFILE) -> dict:
+    """
+    Run a single ROM headless for the given number of frames and report on it.
+    Unknown opcodes get recorded and skipped, any other error stops the ROM.
+    """
+    screen = Chip8Framebuffer()
+    cpu = ENGINES[engine](screen, False, ipf, seed, quirks)
+
+    with open(FONT, "rb") as font_file:
+        cpu.load_memory(bytearray(font_file.read()), 0x0)
+
+    result = {"rom": os.path.basename(path), "error": None}
+    try:
+        with open(path, "rb") as rom_file:
+            rom = rom_file.read()
+        cpu.load_memory(bytearray(rom), 0x200)
+        preload(cpu, load_analysis(rom))
+    except Exception as e:
+        result["error"] = str(e)
+        return result
+
+    unimplemented = {}
+    start = timer()
+    # a SUPER-CHIP program may stop itself (00FD) before that
+    while cpu.frame < frames and not cpu.exited:
+        try:
+            cpu.run_frame()
+        except OpcodeNotImplementedException as e:
+            # PC already points past the unknown opcode, so just carry on
+            nibbles, offset = e.args[0]
+            opcode = "".join(f"{nibble:X}" for nibble in nibbles)
+            unimplemented[opcode] = unimplemented.get(opcode, 0) + 1
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e} (PC {hex(cpu.pc)})"
+            break
+    wall_time = timer() - start
+
+    # the virtual clock also counts the passes through idle loops that were skipped instead of run
+    cycles = cpu.cycles
+    executed = cycles - cpu.skipped
+    result.update(
+        {
+            "frames": cpu.frame,
+            "cycles": cycles,
+            "executed": executed,
+            "skipped": cpu.skipped / cycles if cycles else 0.0,
+            "wall_time": wall_time,
+            "instructions_per_second": executed / wall_time if wall_time else 0.0,
+            "framebuffer_hash": hashlib.sha1(screen.to_bytes()).hexdigest(),
+            "unimplemented_opcodes": unimplemented,
+        }
+    )
+    return result
+
+
+def write_csv(results, output):
+    fields = [
+        "rom",
+        "frames",
+        "cycles",
+        "executed",
+        "skipped",
+        "wall_time",
+        "instructions_per_second",
+        "framebuffer_hash",
+        "unimplemented_opcodes",
+        "error",
+    ]
+    writer = csv.DictWriter(output, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+    for result in results:
+        row = dict(result)
+        row["unimplemented_opcodes"] = " ".join(sorted(result.get("unimplemented_opcodes", {})))
+        writer.writerow(row)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Run a directory of ROMs headless and report on each of them")
+    parser.add_argument("roms", help="Directory of ROMs")
+    parser.add_argument("-f", "--frames", type=int, default=600, help="60 Hz frames to run every ROM for (default 600)")
+    parser.add_argument("-c", "--cycles", type=int, help="Instructions to run every ROM for, rounded up to whole frames (overrides --frames)")
+    parser.add_argument("-i", "--ipf", type=int, default=CYCLES_PER_FRAME, help=f"Instructions per frame (default {CYCLES_PER_FRAME})")
+    parser.add_argument("-e", "--engine", choices=list(ENGINES), default="interpreter", help="Execution engine (default interpreter)")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="Seed for Cxnn, so framebuffer hashes are reproducible (default 0)")
+    parser.add_argument("-q", "--quirks", choices=list(PROFILES), default=DEFAULT_PROFILE, help=f"Quirk profile (default {DEFAULT_PROFILE})")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes (default: one per core)")
+    parser.add_argument("-o", "--output", help="Write report to file instead of stdout")
+    parser.add_argument("--format", choices=["json", "csv"], default="json", help="Report format (default json)")
+    args = parser.parse_args()
+
+    frames = args.frames
+    if args.cycles is not None:
+        frames = -(-args.cycles // args.ipf)
+
+    paths = sorted(
+        os.path.join(args.roms, name)
+        for name in os.listdir(args.roms)
+        if os.path.isfile(os.path.join(args.roms, name))
+    )
+
+    start = timer()
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        results = list(
+            executor.map(
+                run_rom,
+                paths,
+                [frames] * len(paths),
+                [args.ipf] * len(paths),
+                [args.engine] * len(paths),
+                [args.seed] * len(paths),
+                [args.quirks] * len(paths),
+            )
+        )
+    print(f"Ran {len(paths)} ROMs in {timer() - start:.2f}s", file=sys.stderr)
+
+    output = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        if args.format == "csv":
+            write_csv(results, output)
+        else:
+            json.dump(results, output, indent=2)
+            output.write("\n")
+    finally:
+        if args.output:
+            output.close()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+from chip8.shared import SharedStateReader
+from argparse import ArgumentParser
+import time
+
+
+def render(state: dict) -> str:
+    registers = " ".join(f"V{i:X}={value:02X}" for i, value in enumerate(state["v"]))
+    stack = " ".join(f"{address:#05x}" for address in state["stack"]) or "-"
+    keys = " ".join(f"{key:X}" for key in range(16) if state["keypad"] >> key & 1) or "-"
+    lines = [
+        f"frame {state['frame']}  PC {state['pc']:#05x}  I {state['I']:#05x}  "
+        f"DT {state['delay']}  ST {state['sound']}  keys {keys}",
+        registers,
+        f"stack {stack}",
+    ]
+    lines.extend(
+        format(row, f"0{state['width']}b").replace("0", ".").replace("1", "#")
+        for row in state["rows"]
+    )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Watch a running emulator started with chip8.py --share")
+    parser.add_argument("name", help="Name of the shared state")
+    parser.add_argument("-n", "--interval", type=float, default=0.1, help="Seconds between updates (default 0.1)")
+    parser.add_argument("--once", help="Print the state once and exit", action="store_true")
+    args = parser.parse_args()
+
+    reader = SharedStateReader(args.name)
+    try:
+        if args.once:
+            print(render(reader.read()))
+        else:
+            while True:
+                # move the cursor home and redraw in place
+                print("\x1b[H\x1b[2J" + render(reader.read()), flush=True)
+                time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.close()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+import os
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from chip8.cpu import Chip8CPU
+from chip8.framebuffer import Chip8Framebuffer
+from chip8.translator import Chip8TranslatingCPU
+from chip8.replay import load_recording, restore, replay, screen_digest
+from chip8.quirks import DEFAULT_PROFILE
+from timeit import default_timer as timer
+from argparse import ArgumentParser
+import hashlib
+import sys
+
+FONT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "font.ch8")
+ENGINES = {"interpreter": Chip8CPU, "block": Chip8TranslatingCPU}
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Replay a session recorded with chip8.py --record headless, as fast as possible")
+    parser.add_argument("recording", help="Recording to replay")
+    parser.add_argument("-r", "--rom", required=True, help="ROM the recording was made with")
+    parser.add_argument("-e", "--engine", action="append", choices=list(ENGINES), help="Replay on this engine (repeatable, default all)")
+    args = parser.parse_args()
+
+    recording = load_recording(args.recording)
+    with open(args.rom, "rb") as rom_file:
+        rom = rom_file.read()
+    if hashlib.sha1(rom).hexdigest() != recording["rom_sha1"]:
+        sys.exit("ROM does not match the recording")
+    with open(FONT, "rb") as font_file:
+        font = font_file.read()
+
+    failed = False
+    for engine in args.engine or list(ENGINES):
+        cpu = ENGINES[engine](
+            Chip8Framebuffer(), False, recording["cycles_per_frame"], recording["seed"], recording.get("quirks", DEFAULT_PROFILE)
+        )
+        cpu.load_memory(bytearray(font), 0x0)
+        cpu.load_memory(bytearray(rom), 0x200)
+        restore(cpu, recording)
+        cycles = cpu.cycles
+
+        start = timer()
+        mismatches = replay(cpu, recording)
+        elapsed = timer() - start
+
+        # passes through idle loops are counted on the virtual clock but skipped, they do not count as executed
+        cycles = cpu.cycles - cycles
+        executed = cycles - cpu.skipped
+        print(
+            f"{engine:<12} {cpu.frame} frames, {executed:,} instructions executed in {elapsed:.2f}s "
+            f"({executed / elapsed:,.0f} executed ips, {cpu.skipped / cycles * 100 if cycles else 0:.1f}% of the clock skipped as idle), "
+            f"screen {screen_digest(cpu.display)}"
+        )
+        if mismatches:
+            failed = True
+            print(f"{engine:<12} screen differs from the recording at frames {mismatches[:10]}")
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+import os
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from chip8.cpu import Chip8CPU, CYCLES_PER_FRAME
+from chip8.quirks import PROFILES, DEFAULT_PROFILE
+from chip8.framebuffer import Chip8Framebuffer
+from chip8.translator import Chip8TranslatingCPU
+from chip8.analyzer import load_analysis, preload
+from chip8.pacing import FramePacer
+from chip8.stream import FrameServer
+from argparse import ArgumentParser
+import asyncio
+
+FONT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "font.ch8")
+ENGINES = {"interpreter": Chip8CPU, "block": Chip8TranslatingCPU}
+PORT = 8064
+
+
+async def serve(args):
+    cpu = ENGINES[args.engine](Chip8Framebuffer(), False, args.ipf, args.seed, args.quirks)
+    with open(FONT, "rb") as font_file:
+        cpu.load_memory(bytearray(font_file.read()), 0x0)
+    with open(args.rom, "rb") as rom_file:
+        rom = rom_file.read()
+    cpu.load_memory(bytearray(rom), 0x200)
+    preload(cpu, load_analysis(rom))
+
+    server = FrameServer(cpu)
+    if args.unix:
+        await server.start_unix(args.unix)
+    else:
+        await server.start_tcp(args.host, args.port)
+    print("Streaming on", ", ".join(str(address) for address in server.sockets()), flush=True)
+
+    # viewers are served in between frames, while the pacer waits
+    pacer = FramePacer(args.speed)
+    try:
+        # a SUPER-CHIP program may stop itself (00FD)
+        while not cpu.exited:
+            cpu.run_frame()
+            server.publish()
+            await asyncio.sleep(pacer.delay())
+    finally:
+        await server.close()
+        if args.unix:
+            os.unlink(args.unix)
+        print(f"Streamed {cpu.frame} frames, {server.merged} updates merged for viewers that fell behind", flush=True)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Run a ROM headless and stream its screen to viewer.py")
+    parser.add_argument("-r", "--rom", required=True, help="ROM to load")
+    parser.add_argument("-q", "--quirks", choices=list(PROFILES), default=DEFAULT_PROFILE, help=f"Quirk profile (default {DEFAULT_PROFILE})")
+    parser.add_argument("-i", "--ipf", type=int, default=CYCLES_PER_FRAME, help=f"Instructions per 60 Hz frame (default {CYCLES_PER_FRAME})")
+    parser.add_argument("-s", "--speed", type=float, default=1.0, help="Speed relative to real time, 0 runs unthrottled (default 1)")
+    parser.add_argument("-e", "--engine", choices=list(ENGINES), default="block", help="Engine to run on (default block)")
+    parser.add_argument("--seed", type=int, help="Seed for the random number generator (default random)")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=PORT, help=f"TCP port to listen on (default {PORT})")
+    parser.add_argument("--unix", metavar="PATH", help="Listen on a Unix socket at PATH instead of TCP")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
@@ -45,7 +45,7 @@ for y, row in enumerate(data):
         if char == '1':
             display.flip_pixel(x,y)
 
-display.update()
+display.present()
 
 while True:
     for event in pygame.event.get():
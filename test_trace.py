@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+from chip8.cpu import Chip8CPU
+from chip8.framebuffer import Chip8Framebuffer
+from chip8.trace import Tracer, RECORD
+
+CAPACITY = 9
+
+# V0 += 1 over and over, so every record has a different V0
+ROM = bytes.fromhex("7001" "1200")
+
+
+def trace(instructions: int) -> list:
+    """
+    Run the ROM with a ring buffer of CAPACITY records and return the V0 value of every record kept
+    """
+    cpu = Chip8CPU(Chip8Framebuffer(), seed=0)
+    cpu.load_memory(bytearray(ROM), 0x200)
+    tracer = Tracer(cpu, capacity=CAPACITY)
+    tracer.enable()
+    cpu.run(instructions)
+    return [record[4] for record in RECORD.iter_unpack(tracer.records())]
+
+
+for instructions in (CAPACITY - 1, CAPACITY, CAPACITY + 1, 2 * CAPACITY, 2 * CAPACITY + 3):
+    kept = trace(instructions)
+    expected = min(instructions, CAPACITY)
+    assert len(kept) == expected, f"{instructions} instructions: {len(kept)} records kept, expected {expected}"
+    # records come oldest first and end with the newest instruction (V0 goes up every other instruction)
+    assert kept[-1] == (instructions + 1) // 2, f"{instructions} instructions: newest record has V0 {kept[-1]}"
+    assert kept == sorted(kept), f"{instructions} instructions: records out of order"
+    print(f"{instructions:>3} instructions: {len(kept)} records kept, ok")
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+from chip8.trace import read_trace, WROTE_MEMORY
+from argparse import ArgumentParser
+import sys
+
+
+def parse_range(text: str):
+    """
+    "0x200-0x2ff" -> (0x200, 0x2ff), a single address matches only itself
+    """
+    start, _, end = text.partition("-")
+    start = int(start, 16)
+    return start, int(end, 16) if end else start
+
+
+def parse_pattern(text: str):
+    """
+    Opcode pattern with x as wildcard nibble, e.g. "Dxxx" or "Fx55" -> (mask, value)
+    """
+    if len(text) != 4:
+        raise ValueError(f"Opcode pattern must have 4 nibbles: {text}")
+    mask = value = 0
+    for nibble in text:
+        mask <<= 4
+        value <<= 4
+        if nibble not in "xX":
+            mask |= 0xF
+            value |= int(nibble, 16)
+    return mask, value
+
+
+def format_record(frame, pc, opcode, I, v, flags) -> str:
+    registers = " ".join(f"{value:02X}" for value in v)
+    marker = "  mem" if flags & WROTE_MEMORY else ""
+    return f"{frame:>8} {pc:#06x} {opcode:04X}  I={I:#06x}  V={registers}{marker}"
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Decode a binary execution trace into text")
+    parser.add_argument("trace", help="Trace file written with chip8.py --trace")
+    parser.add_argument("--pc", action="append", type=parse_range, help="Only show instructions at this address or range, e.g. 0x200-0x2ff (repeatable)")
+    parser.add_argument("--opcode", action="append", type=parse_pattern, help="Only show opcodes matching this pattern, x being any nibble, e.g. Dxxx (repeatable)")
+    parser.add_argument("--memory", action="store_true", help="Only show instructions which wrote to memory")
+    parser.add_argument("-n", "--limit", type=int, help="Stop after this many lines")
+    args = parser.parse_args()
+
+    shown = 0
+    with open(args.trace, "rb") as f:
+        print(f"{'frame':>8} {'pc':<6} {'op':<4}  {'I':<7}  V0-VF after the instruction")
+        for frame, pc, opcode, I, v, flags in read_trace(f):
+            if args.pc and not any(start <= pc <= end for start, end in args.pc):
+                continue
+            if args.opcode and not any(opcode & mask == value for mask, value in args.opcode):
+                continue
+            if args.memory and not flags & WROTE_MEMORY:
+                continue
+            try:
+                print(format_record(frame, pc, opcode, I, v, flags))
+            except BrokenPipeError:
+                sys.exit(0)
+            shown += 1
+            if args.limit is not None and shown >= args.limit:
+                break
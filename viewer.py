@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+from chip8.display import Chip8Display
+from chip8.input import PygameInput
+from chip8.pacing import FRAME_RATE
+from chip8.stream import FrameClient
+from argparse import ArgumentParser
+import asyncio
+import pygame
+
+PORT = 8064
+
+
+async def view(args):
+    if args.unix:
+        client = await FrameClient.connect_unix(args.unix)
+    else:
+        client = await FrameClient.connect_tcp(args.host, args.port)
+
+    screen = Chip8Display()
+    pygame.display.set_caption(f"CHIP8 ({args.unix or f'{args.host}:{args.port}'})")
+    keyboard = PygameInput(client)
+    receiver = asyncio.ensure_future(client.receive(screen))
+    try:
+        while not receiver.done():
+            keyboard.handle_events(pygame.event.get())
+            screen.present()
+            await asyncio.sleep(1 / FRAME_RATE)
+        # raises if the stream could not be shown
+        receiver.result()
+    finally:
+        receiver.cancel()
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Watch and play a ROM streamed by serve.py")
+    parser.add_argument("--host", default="127.0.0.1", help="Server to connect to (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=PORT, help=f"TCP port to connect to (default {PORT})")
+    parser.add_argument("--unix", metavar="PATH", help="Connect to a Unix socket at PATH instead of TCP")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(view(args))
+    except KeyboardInterrupt:
+        pass